@@ -3,76 +3,150 @@ Configuration management for Gemini CLI.
 """
 
 import os
-import yaml
-from pathlib import Path
+import copy
+import json
+import functools
+import logging
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    "api_keys": {},
+    "default_model": "models/gemini-2.5-pro-exp-03-25",
+    "settings": {
+        "max_tokens": 1000000,
+        "temperature": 0.7,
+        "token_warning_threshold": 800000,
+        "auto_compact_threshold": 950000,
+    }
+}
+
+# Shared Config instance, created on first call to get_config()
+_INSTANCE = None
+
+@functools.lru_cache(maxsize=1)
+def _read_config_file(path, mtime_ns):
+    """Parse the config file. Cached on (path, mtime) so unchanged files are parsed once."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return json.loads(data)
+
+def _read_legacy_yaml(path):
+    """Parse a pre-JSON config.yaml. PyYAML is only imported for this one-time migration."""
+    import yaml
+    try:
+        from yaml import CSafeLoader as SafeLoader
+    except ImportError:
+        from yaml import SafeLoader
+    with open(path, 'rb') as f:
+        data = f.read()
+    return yaml.load(data, Loader=SafeLoader)
 
 class Config:
     """Manages configuration for the Gemini CLI application."""
-    
+
     def __init__(self):
-        self.config_dir = Path.home() / ".config" / "gemini-code"
-        self.config_file = self.config_dir / "config.yaml"
-        self._ensure_config_exists()
+        # Plain os.path strings: cheaper than pathlib on this startup path
+        self.config_dir = os.path.join(os.path.expanduser("~"), ".config", "gemini-code")
+        self.config_file = os.path.join(self.config_dir, "config.json")
+        self.legacy_config_file = os.path.join(self.config_dir, "config.yaml")
+        self.config = None
+        self._mtime = None
+        self._batch_depth = 0 # > 0 while inside a `with config:` block
+        self._dirty = False
         self.config = self._load_config()
-    
-    def _ensure_config_exists(self):
-        """Create config directory and file if they don't exist."""
-        self.config_dir.mkdir(parents=True, exist_ok=True)
-        
-        if not self.config_file.exists():
-            default_config = {
-                "api_keys": {},
-                "default_model": "models/gemini-2.5-pro-exp-03-25",
-                "settings": {
-                    "max_tokens": 1000000,
-                    "temperature": 0.7,
-                    "token_warning_threshold": 800000,
-                    "auto_compact_threshold": 950000,
-                }
-            }
-            
-            with open(self.config_file, 'w') as f:
-                yaml.dump(default_config, f)
-    
+
     def _load_config(self):
-        """Load configuration from file."""
-        with open(self.config_file, 'r') as f:
-            return yaml.safe_load(f)
-    
+        """Load configuration from file, skipping the parse if the file is unchanged."""
+        try:
+            mtime = os.stat(self.config_file).st_mtime_ns
+        except FileNotFoundError:
+            return self._create_config()
+        if self.config is not None and mtime == self._mtime:
+            return self.config
+        self._mtime = mtime
+        return _read_config_file(self.config_file, mtime)
+
+    def _create_config(self):
+        """First run: migrate an existing config.yaml, otherwise write the default config."""
+        os.makedirs(self.config_dir, exist_ok=True)
+        try:
+            self.config = _read_legacy_yaml(self.legacy_config_file) or {}
+            log.info(f"Migrated {self.legacy_config_file} to {self.config_file}")
+        except FileNotFoundError:
+            self.config = copy.deepcopy(DEFAULT_CONFIG)
+        self._save_config()
+        return self.config
+
     def _save_config(self):
-        """Save configuration to file."""
-        with open(self.config_file, 'w') as f:
-            yaml.dump(self.config, f)
-    
+        """Save configuration to file. Deferred until the outermost `with config:` block exits."""
+        if self._batch_depth:
+            self._dirty = True
+            return
+        # Write to a sibling temp file and rename so a crash never leaves a truncated config
+        tmp_file = self.config_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.config, f, indent=2)
+        os.replace(tmp_file, self.config_file)
+        self._dirty = False
+        # Our own write shouldn't force a re-parse on the next load
+        self._mtime = os.stat(self.config_file).st_mtime_ns
+
+    def __enter__(self):
+        """Batch several setters into a single write: `with config: config.set_...(); ...`"""
+        self._batch_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._batch_depth -= 1
+        if not self._batch_depth and self._dirty:
+            self._save_config()
+        return False
+
+    def reload(self):
+        """Re-read the config file if it changed on disk since it was last loaded."""
+        self.config = self._load_config()
+        return self.config
+
     def get_api_key(self, provider):
         """Get API key for a specific provider."""
         return self.config.get("api_keys", {}).get(provider)
-    
+
     def set_api_key(self, provider, key):
         """Set API key for a specific provider."""
         if "api_keys" not in self.config:
             self.config["api_keys"] = {}
-        
+
         self.config["api_keys"][provider] = key
         self._save_config()
-    
+
     def get_default_model(self):
         """Get the default model."""
         return self.config.get("default_model")
-    
+
     def set_default_model(self, model):
         """Set the default model."""
         self.config["default_model"] = model
         self._save_config()
-    
+
     def get_setting(self, setting, default=None):
         """Get a specific setting."""
         return self.config.get("settings", {}).get(setting, default)
-    
+
     def set_setting(self, setting, value):
         """Set a specific setting."""
         if "settings" not in self.config:
             self.config["settings"] = {}
-        
+
         self.config["settings"][setting] = value
-        self._save_config()
\ No newline at end of file
+        self._save_config()
+
+
+def get_config():
+    """Return the shared Config instance, loading it on first use."""
+    global _INSTANCE
+    if _INSTANCE is None:
+        _INSTANCE = Config()
+    else:
+        _INSTANCE.reload()
+    return _INSTANCE
@@ -6,50 +6,29 @@ Passes console object to model.
 
 import os
 import sys
+import asyncio
 import click
 from rich.console import Console
-from rich.markdown import Markdown
-from rich.panel import Panel
-from pathlib import Path
-import yaml
-import google.generativeai as genai
 import logging
 import time
+import functools
 
-from .models.gemini import GeminiModel, list_available_models
-from .config import Config
-from .utils import count_tokens
-from .tools import AVAILABLE_TOOLS
+from .config import get_config
+# NOTE: .models.gemini, .tools and rich's Markdown/Panel are imported inside the
+# functions that need them so short subcommands (setup, set-default-model) start fast.
 
-# Setup console and config
+# Setup console (config is loaded lazily via get_config())
 console = Console() # Create console instance HERE
-try:
-    config = Config()
-except Exception as e:
-    console.print(f"[bold red]Error loading configuration:[/bold red] {e}")
-    config = None
-
-# Setup logging - MORE EXPLICIT CONFIGURATION
-log_level = os.environ.get("LOG_LEVEL", "WARNING").upper() # <-- Default back to WARNING
-log_format = '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
-
-# Get root logger and set level
-root_logger = logging.getLogger()
-root_logger.setLevel(log_level)
-
-# Remove existing handlers to avoid duplicates if basicConfig was called elsewhere
-for handler in root_logger.handlers[:]:
-    root_logger.removeHandler(handler)
-
-# Add a stream handler to output to console
-stream_handler = logging.StreamHandler(sys.stdout) 
-stream_handler.setLevel(log_level)
-formatter = logging.Formatter(log_format)
-stream_handler.setFormatter(formatter)
-root_logger.addHandler(stream_handler)
 
 log = logging.getLogger(__name__) # Get logger for this module
-log.info(f"Logging initialized with level: {log_level}") # Confirm level
+
+def _init_logging():
+    """Configure root logging once a command actually runs (not at import time)."""
+    log_level = os.environ.get("LOG_LEVEL", "WARNING").upper() # <-- Default back to WARNING
+    log_format = '%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s'
+    # force=True replaces any handlers installed earlier (e.g. by an imported module's basicConfig)
+    logging.basicConfig(level=log_level, format=log_format, stream=sys.stdout, force=True)
+    log.info(f"Logging initialized with level: {log_level}") # Confirm level
 
 # --- Default Model ---
 DEFAULT_MODEL = "gemini-2.5-pro-exp-03-25"
@@ -69,6 +48,15 @@ GEMINI_CODE_ART = r"""
 """
 # --- End ASCII Art ---
 
+@functools.lru_cache(maxsize=1)
+def _build_welcome_banner():
+    """Parses the ASCII art markup and builds the welcome Panel once."""
+    from rich.panel import Panel
+    from rich.text import Text
+    art = Text.from_markup(GEMINI_CODE_ART)
+    welcome_panel = Panel("[b]Welcome to Gemini Code AI Assistant![/b]", border_style="blue", expand=False)
+    return art, welcome_panel
+
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
@@ -81,7 +69,11 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 @click.pass_context
 def cli(ctx, model):
     """Interactive CLI for Gemini models with coding assistance tools."""
-    if not config:
+    _init_logging()
+    try:
+        config = get_config()
+    except Exception as e:
+        console.print(f"[bold red]Error loading configuration:[/bold red] {e}")
         console.print("[bold red]Configuration could not be loaded. Cannot proceed.[/bold red]")
         sys.exit(1)
 
@@ -95,24 +87,25 @@ def cli(ctx, model):
 @cli.command()
 @click.argument('key', required=True)
 def setup(key):
-    if not config: console.print("[bold red]Config error.[/bold red]"); return
+    config = get_config()
     try: config.set_api_key("google", key); console.print("[green]✓[/green] Google API key saved.")
     except Exception as e: console.print(f"[bold red]Error saving API key:[/bold red] {e}")
 
 @cli.command()
 @click.argument('model_name', required=True)
 def set_default_model(model_name):
-    if not config: console.print("[bold red]Config error.[/bold red]"); return
+    config = get_config()
     try: config.set_default_model(model_name); console.print(f"[green]✓[/green] Default model set to [bold]{model_name}[/bold].")
     except Exception as e: console.print(f"[bold red]Error setting default model:[/bold red] {e}")
 
 @cli.command()
 def list_models():
-    if not config: console.print("[bold red]Config error.[/bold red]"); return
+    config = get_config()
     api_key = config.get_api_key("google")
     if not api_key: console.print("[bold red]Error:[/bold red] API key not found. Run 'gemini setup'."); return
     console.print("[yellow]Fetching models...[/yellow]")
     try:
+        from .models.gemini import list_available_models
         models_list = list_available_models(api_key)
         if not models_list or (isinstance(models_list, list) and len(models_list) > 0 and isinstance(models_list[0], dict) and "error" in models_list[0]):
              console.print(f"[red]Error listing models:[/red] {models_list[0].get('error', 'Unknown error') if models_list else 'No models found or fetch error.'}"); return
@@ -125,12 +118,14 @@ def list_models():
 # --- MODIFIED start_interactive_session to accept and pass console ---
 def start_interactive_session(model_name: str, console: Console):
     """Start an interactive chat session with the selected Gemini model."""
-    if not config: console.print("[bold red]Config error.[/bold red]"); return
+    from rich.markdown import Markdown
+    config = get_config()
 
     # --- Display Welcome Art ---
     console.clear()
-    console.print(GEMINI_CODE_ART)
-    console.print(Panel("[b]Welcome to Gemini Code AI Assistant![/b]", border_style="blue", expand=False))
+    art, welcome_panel = _build_welcome_banner()
+    console.print(art)
+    console.print(welcome_panel)
     time.sleep(0.1)
     # --- End Welcome Art ---
 
@@ -142,6 +137,7 @@ def start_interactive_session(model_name: str, console: Console):
 
     try:
         console.print(f"\nInitializing model [bold]{model_name}[/bold]...")
+        from .models.gemini import GeminiModel
         # Pass the console object to GeminiModel constructor
         model = GeminiModel(api_key=api_key, console=console, model_name=model_name)
         console.print("[green]Model initialized successfully.[/green]\n")
@@ -155,23 +151,21 @@ def start_interactive_session(model_name: str, console: Console):
     # --- Session Start Message ---
     console.print("Type '/help' for commands, '/exit' or Ctrl+C to quit.")
 
-    # --- Command mapping for interactive mode ---
-    interactive_commands = {
-        "/exit": lambda: True, # Return True to signal exit
-        "/help": show_help,
-    }
-    # ---
+    # One event loop for the whole session: the SDK's async client binds to the loop it first runs on,
+    # so a fresh asyncio.run() per prompt would break from the second prompt on.
+    loop = asyncio.new_event_loop()
 
     while True:
         try:
             user_input = console.input("[bold blue]You:[/bold blue] ")
-            command_func = interactive_commands.get(user_input.lower())
+            # Only slash-prefixed input can be a command; skip lowercasing everything else
+            command_func = _COMMANDS.get(user_input.strip().lower()) if user_input.startswith('/') else None
 
             if command_func:
                 if command_func(): break # Break if the command signals an exit
                 else: continue # Otherwise, continue to next prompt
 
-            response_text = model.generate(user_input)
+            response_text = loop.run_until_complete(model.generate(user_input))
 
             if response_text is None: console.print("[red]Received an empty response from the model.[/red]"); log.warning("generate() returned None unexpectedly."); continue
 
@@ -185,9 +179,15 @@ def start_interactive_session(model_name: str, console: Console):
             console.print(f"\n[bold red]An error occurred during the session:[/bold red] {e}")
             log.error("Error during interactive loop", exc_info=True)
 
+    model.close() # Deletes the session's context cache
+    loop.close()
 
-def show_help():
-    """Show help information for interactive mode."""
+
+@functools.lru_cache(maxsize=1)
+def _build_help_panel():
+    """Builds the /help panel once; AVAILABLE_TOOLS doesn't change during a session."""
+    from rich.panel import Panel
+    from .tools import AVAILABLE_TOOLS
     tool_list_formatted = ""
     if AVAILABLE_TOOLS:
         # Add indentation for the bullet points
@@ -201,6 +201,7 @@ def show_help():
  [cyan]Interactive Commands:[/cyan]
   /exit
   /help
+  /compact   Summarize older history now to free context
 
  [cyan]CLI Commands:[/cyan]
   gemini setup KEY
@@ -214,7 +215,28 @@ def show_help():
 {tool_list_formatted}
 """
     # Print directly to Panel without Markdown wrapper
-    console.print(Panel(help_text, title="Help", border_style="green", expand=False))
+    return Panel(help_text, title="Help", border_style="green", expand=False)
+
+
+def show_help():
+    """Show help information for interactive mode."""
+    console.print(_build_help_panel())
+
+
+# --- Command mapping for interactive mode ---
+# Handlers return True to signal the session should exit.
+def _cmd_exit():
+    return True
+
+def _cmd_help():
+    show_help()
+    return False
+
+_COMMANDS = {
+    "/exit": _cmd_exit,
+    "/help": _cmd_help,
+}
+# ---
 
 
 if __name__ == "__main__":
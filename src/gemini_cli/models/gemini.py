@@ -5,25 +5,277 @@ Gemini model integration for the CLI tool.
 import google.generativeai as genai
 from google.generativeai import protos
 from google.generativeai.types import FunctionDeclaration, Tool
+import os
+import asyncio
 import logging
 import time
+import hashlib
+import collections
+import itertools
+import contextlib
+import functools
+import datetime
 from rich.console import Console
 from rich.panel import Panel
 import questionary
 
 # Import exceptions for specific error handling if needed later
-from google.api_core.exceptions import ResourceExhausted
+from google.api_core.exceptions import ResourceExhausted, NotFound, PermissionDenied
 
-from ..utils import count_tokens
-from ..tools import get_tool, AVAILABLE_TOOLS
+from ..utils import count_tokens, count_tokens_batch
+from ..tools import get_tool, AVAILABLE_TOOLS, iter_tool_classes
 
-# Setup logging (basic config, consider moving to main.py)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
+# Logging is configured by main.cli(); importing this module has no logging side effects
 log = logging.getLogger(__name__)
 
 MAX_AGENT_ITERATIONS = 10
 FALLBACK_MODEL = "gemini-1.5-pro-latest"
 CONTEXT_TRUNCATION_THRESHOLD_TOKENS = 800000 # Example token limit
+KEEP_LAST_HISTORY_ITEMS = 5 # Most recent history items never evicted by context management
+MAX_HISTORY_TAIL_ITEMS = 1000 # Hard cap on history items after the fixed head, independent of the token budget
+NODE_COMPRESS_TOKEN_THRESHOLD = 4000 # Middle history items larger than this get summarized first
+COMPACTION_MODEL = "gemini-1.5-flash" # Cheaper model used to summarize history
+MAX_COMPACTION_INPUT_CHARS_PER_ITEM = 20000 # Cap per item when collapsing a span into one summary
+READ_ONLY_TOOLS = frozenset({"ls", "view", "grep", "tree", "glob"}) # Side-effect free; safe to start early / run concurrently
+MAX_PARALLEL_TOOL_CALLS = 4
+PRELOADED_TOOLS = ("ls", "view", "grep", "edit", "create_file", "task_complete") # Instantiated up front (if registered)
+LARGE_PAYLOAD_TOOLS = frozenset({"edit", "create_file"}) # Status line shows only the size of their args
+CONTEXT_CACHE_TTL = datetime.timedelta(hours=1) # Lifetime of the cachedContents entry holding system prompt + tools
+MIN_CONTEXT_CACHE_TOKENS = 4096 # Smallest prefix worth caching; the API rejects smaller ones (more for some models)
+EXACT_COUNT_MARGIN = 0.10 # Only pay for exact token counts when the estimate is this close to the budget
+OBS_TOKEN_THRESHOLD = 4000 # Tool outputs larger than this are compressed before entering history
+OBS_LS_MAX_ENTRIES = 50 # Per kind (directories / other entries) when compressing ls output
+OBS_HEAD_TAIL_LINES = 60 # Lines kept at each end when eliding the middle of a large output
+MAX_ARCHIVED_OBSERVATIONS = 50 # Uncompressed originals kept in GeminiModel._obs_archive
+
+NODE_SUMMARY_PROMPT = "Summarize this tool/assistant turn, preserving file paths, identifiers, error messages:"
+OBS_SUMMARY_PROMPT = (
+    "Summarize this tool output for a coding assistant. Preserve file paths, line numbers, "
+    "identifiers, counts and error messages verbatim:"
+)
+HISTORY_SUMMARY_PROMPT = (
+    "Summarize the following portion of a coding-assistant session (user requests, tool calls and "
+    "tool results). Preserve file paths, identifiers, decisions made, and error messages:"
+)
+
+def _part_kind(part) -> str | None:
+    """Returns which field of a history part is set ('text', 'function_call', 'function_response', ...)."""
+    if isinstance(part, str):
+        return "text"
+    try:
+        return type(part).pb(part).WhichOneof("data")
+    except Exception:
+        return None
+
+def _entry_has(entry: dict, kind: str) -> bool:
+    """True if any part of a history entry is of this kind (see _part_kind)."""
+    return any(_part_kind(p) == kind for p in entry['parts'])
+
+def _entry_model_text(entry: dict) -> str:
+    """The text parts of a model entry, joined; function_call parts carry no text."""
+    texts = (p if isinstance(p, str) else getattr(p, 'text', '') for p in entry['parts'])
+    return "\n".join(t for t in texts if t).strip()
+
+def _function_response_part(name: str, result) -> protos.Part:
+    """Part carrying FunctionResponse(name, response={"result": result}).
+
+    The result string is written straight into the underlying Struct instead of passing a dict
+    through proto-plus marshaling, which type-checks and copies it.
+    """
+    part = protos.Part(function_response=protos.FunctionResponse(name=name))
+    result_str = result if isinstance(result, str) else str(result)
+    protos.Part.pb(part).function_response.response.fields["result"].string_value = result_str
+    return part
+
+def _is_failed_model_part(part) -> bool:
+    """True for a model part that shouldn't be kept after a failed request: a function_call or empty text."""
+    kind = _part_kind(part)
+    if kind == "function_call":
+        return True
+    return not (part if isinstance(part, str) else getattr(part, 'text', ''))
+
+def _part_text(part) -> str:
+    """Plain-text form of a history part, used as summarization input."""
+    if isinstance(part, str):
+        return part
+    return getattr(part, 'text', None) or str(part)
+
+_DENSE_CHARS = "{}()[]<>=:;,.\"'\n"
+
+def _estimate_tokens_fast(text: str) -> int:
+    """Cheap token estimate: ~4 chars per token, with punctuation/newlines (common in code) counted denser.
+    Not memoized: history entries keep their estimate under '_tok', so each text is counted once."""
+    dense = sum(map(text.count, _DENSE_CHARS))
+    return max(1, (len(text) - dense) // 4 + dense // 2)
+
+def _estimate_part_tokens(part) -> int:
+    """Heuristic token estimate for one history part. Function calls/responses are counted via their text form."""
+    return _estimate_tokens_fast(_part_text(part))
+
+def _fmt_arg(key: str, value, summarize: bool = False, max_len: int = 30) -> str:
+    """`key=value` for the tool status line, with the value shortened (or just sized when `summarize`)."""
+    s = str(value)
+    if summarize:
+        return f"{key}=<{len(s)} chars>"
+    return f"{key}={s[:max_len]}..." if len(s) > max_len else f"{key}={s}"
+
+def _content_preview(content: str, max_lines: int, head_chars: int = 4096) -> str:
+    """First `max_lines` lines of content for the edit confirmation panel.
+
+    Only the first `head_chars` characters are split; the rest is just counted, so a multi-MB
+    `content` arg doesn't get split into a list of every line. Lines are counted as splitlines()
+    does: a trailing newline ends the last line rather than starting another.
+    """
+    total_lines = content.count('\n') + (not content.endswith('\n')) if content else 0
+    if len(content) <= head_chars and total_lines <= max_lines:
+        return content
+    shown = content[:head_chars].splitlines()[:max_lines]
+    remaining = total_lines - len(shown)
+    return "\n".join(shown) + (f"\n... ({remaining} more lines)" if remaining else "\n... (truncated)")
+
+def _snippet(text: str, max_len: int) -> str:
+    """text cut to max_len chars with '...' if longer, from a single slice."""
+    snip = text[:max_len + 1]
+    return snip[:max_len] + '...' if len(snip) > max_len else snip
+
+def _make_history_entry(role: str, *parts) -> dict:
+    """A history entry with its token estimate cached under '_tok'."""
+    return {'role': role, 'parts': list(parts), '_tok': sum(_estimate_part_tokens(p) for p in parts)}
+
+def _entry_text(entry: dict) -> str:
+    """Plain-text form of all parts of a history entry."""
+    return "\n".join(_part_text(p) for p in entry['parts'])
+
+def _compress_ls_output(text: str, max_entries: int) -> str:
+    """Shortens `ls -lA` output: directories listed first, then other entries, each capped with a '+K more' tail."""
+    lines = text.splitlines()
+    header = [l for l in lines[:1] if l.startswith("total")]
+    entries = lines[len(header):]
+    dirs = [l for l in entries if l.startswith("d")]
+    others = [l for l in entries if not l.startswith("d")]
+    out = list(header)
+    for group in (dirs, others):
+        out.extend(group[:max_entries])
+        if len(group) > max_entries:
+            out.append(f"... +{len(group) - max_entries} more")
+    return "\n".join(out)
+
+def _elide_middle(text: str, keep_lines: int) -> str:
+    """Keeps the first and last `keep_lines` lines of text, replacing the middle with a line-count marker."""
+    lines = text.splitlines()
+    if len(lines) <= 2 * keep_lines:
+        # Few but very long lines: fall back to a character budget
+        keep_chars = keep_lines * 100
+        if len(text) <= 2 * keep_chars:
+            return text
+        return f"{text[:keep_chars]}\n... [{len(text) - 2 * keep_chars} chars elided] ...\n{text[-keep_chars:]}"
+    elided = len(lines) - 2 * keep_lines
+    return "\n".join(lines[:keep_lines] + [f"... [{elided} lines elided] ..."] + lines[-keep_lines:])
+
+@functools.cache
+def _build_tool_declarations() -> tuple[FunctionDeclaration, ...] | None:
+    """Creates FunctionDeclarations from AVAILABLE_TOOLS. Tools are static, so this runs once per process."""
+    declarations = []
+    for tool_name, tool_instance in iter_tool_classes():
+        if hasattr(tool_instance, 'get_function_declaration'):
+            declaration = tool_instance.get_function_declaration()
+            if declaration:
+                declarations.append(declaration)
+                log.debug(f"Generated FunctionDeclaration for tool: {tool_name}")
+            else:
+                log.warning(f"Tool {tool_name} has 'get_function_declaration' but it returned None.")
+        else:
+            # Fallback or skip tools without the method? For now, log warning.
+            log.warning(f"Tool {tool_name} does not have a 'get_function_declaration' method. Skipping.")
+
+    log.info(f"Created {len(declarations)} function declarations for native tool use.")
+    return tuple(declarations) if declarations else None
+
+def _unpack_declaration(func_decl) -> tuple[str, str, tuple]:
+    """(name, description, ((prop, type, description, required), ...)), reading each Schema attribute once."""
+    params = func_decl.parameters
+    props = ()
+    # Ensure parameters exist before trying to access properties
+    if params and params.properties:
+        required_args = set(params.required or ())
+        props = tuple(
+            (prop, getattr(details, 'type', 'UNKNOWN'), getattr(details, 'description', ''), prop in required_args)
+            for prop, details in params.properties.items()
+        )
+    return func_decl.name, func_decl.description, props
+
+# Templates for one tool line in the system prompt
+_ARG_TMPL = "{name}: {type}{suffix} # {desc}"
+_TOOL_TMPL = "- `{name}({args})`: {desc}"
+
+def _format_tool_signature(name: str, description: str, props) -> str:
+    """Simple representation for the system prompt: `name(arg: TYPE? # desc, ...)`: description"""
+    # Include parameter description in the string for clarity; '?' marks optional args
+    args_str = ", ".join([
+        _ARG_TMPL.format_map({'name': prop, 'type': ptype, 'suffix': '' if required else '?', 'desc': pdesc})
+        for prop, ptype, pdesc, required in props
+    ])
+    return _TOOL_TMPL.format_map({'name': name, 'args': args_str, 'desc': description or '(No description provided)'})
+
+@functools.cache
+def _build_system_prompt(declarations: tuple[FunctionDeclaration, ...] | None) -> str:
+    """Creates the system prompt, emphasizing native functions and planning."""
+    signatures = [_unpack_declaration(func_decl) for func_decl in declarations or ()]
+    if signatures:
+        tool_list_str = "\n".join([_format_tool_signature(*sig) for sig in signatures])
+    else:
+        tool_list_str = " - (No tools available with function declarations)"
+
+    # Prompt v13.1 - Native Functions, Planning, Accurate Context
+    return f"""You are Gemini Code, an AI coding assistant running in a CLI environment.
+Your goal is to help the user with their coding tasks by understanding their request, planning the necessary steps, and using the available tools via **native function calls**.
+
+Available Tools (Use ONLY these via function calls):
+{tool_list_str}
+
+Workflow:
+1.  **Analyze & Plan:** Understand the user's request based on the provided directory context (`ls` output) and the request itself. For non-trivial tasks, **first outline a brief plan** of the steps and tools you will use in a text response. **Note:** Actions that modify files (`edit`, `create_file`) will require user confirmation before execution.
+2.  **Execute:** If a plan is not needed or after outlining the plan, make the **first necessary function call** to execute the next step (e.g., `view` a file, `edit` a file, `grep` for text, `tree` for structure).
+3.  **Observe:** You will receive the result of the function call (or a message indicating user rejection). Use this result to inform your next step.
+4.  **Repeat:** Based on the result, make the next function call required to achieve the user's goal. Continue calling functions sequentially until the task is complete.
+5.  **Complete:** Once the *entire* task is finished, **you MUST call the `task_complete` function**, providing a concise summary of what was done in the `summary` argument. 
+    *   The `summary` argument MUST accurately reflect the final outcome (success, partial success, error, or what was done).
+    *   Format the summary using **Markdown** for readability (e.g., use backticks for filenames `like_this.py` or commands `like this`).
+    *   If code was generated or modified, the summary **MUST** contain the **actual, specific commands** needed to run or test the result (e.g., show `pip install Flask` and `python app.py`, not just say "instructions provided"). Use Markdown code blocks for commands.
+
+Important Rules:
+*   **Use Native Functions:** ONLY interact with tools by making function calls as defined above. Do NOT output tool calls as text (e.g., `cli_tools.ls(...)`).
+*   **Sequential Calls:** Call functions one at a time. You will get the result back before deciding the next step. Do not try to chain dependent calls in one turn. The exception is independent read-only lookups (`view`, `grep`, `ls`, `tree`, `glob`): you may request several of these in one turn and they run concurrently.
+*   **Initial Context Handling:** When the user asks a general question about the codebase contents (e.g., "what's in this directory?", "show me the files", "whats in this codebase?"), your **first** response MUST be a summary or list of **ALL** files and directories provided in the initial context (`ls` or `tree` output). Do **NOT** filter this initial list or make assumptions (e.g., about virtual environments). Only after presenting the full initial context should you suggest further actions or use other tools if necessary.
+*   **Accurate Context Reporting:** When asked about directory contents (like "whats in this codebase?"), accurately list or summarize **all** relevant files and directories shown in the `ls` or `tree` output, including common web files (`.html`, `.js`, `.css`), documentation (`.md`), configuration files, build artifacts, etc., not just specific source code types. Do not ignore files just because virtual environments are also present. Use `tree` for a hierarchical view if needed.
+*   **Handling Explanations:** 
+    *   If the user asks *how* to do something, asks for an explanation, or requests instructions (like "how do I run this?"), **provide the explanation or instructions directly in a text response** using clear Markdown formatting.
+    *   **Proactive Assistance:** When providing instructions that culminate in a specific execution command (like `python file.py`, `npm start`, `git status | cat`, etc.), first give the full explanation, then **explicitly ask the user if they want you to run that final command** using the `execute_command` tool. 
+        *   Example: After explaining how to run `calculator.py`, you should ask: "Would you like me to run `python calculator.py | cat` for you using the `execute_command` tool?" (Append `| cat` for commands that might page).
+    *   Do *not* use `task_complete` just for providing information; only use it when the *underlying task* (e.g., file creation, modification) is fully finished.
+*   **Planning First:** For tasks requiring multiple steps (e.g., read file, modify content, write file), explain your plan briefly in text *before* the first function call.
+*   **Precise Edits:** When editing files (`edit` tool), prefer viewing the relevant section first (`view` tool with offset/limit), then use exact `old_string`/`new_string` arguments if possible. Only use the `content` argument for creating new files or complete overwrites.
+*   **Task Completion Signal:** ALWAYS finish action-oriented tasks by calling `task_complete(summary=...)`. 
+    *   The `summary` argument MUST accurately reflect the final outcome (success, partial success, error, or what was done).
+    *   Format the summary using **Markdown** for readability (e.g., use backticks for filenames `like_this.py` or commands `like this`).
+    *   If code was generated or modified, the summary **MUST** contain the **actual, specific commands** needed to run or test the result (e.g., show `pip install Flask` and `python app.py`, not just say "instructions provided"). Use Markdown code blocks for commands.
+
+The user's first message will contain initial directory context and their request."""
+
+@functools.cache
+def _tool_setup() -> tuple:
+    """(declarations, system prompt, Tool, estimated prefix tokens), shared by every GeminiModel instance
+    (including fallback re-inits). Built on first use rather than at import, so commands that only
+    import this module (e.g. list-models) never import the tool modules."""
+    decls = _build_tool_declarations()
+    sys_prompt = _build_system_prompt(decls)
+    gemini_tools = Tool(function_declarations=decls) if decls else None
+    # Estimated size of the fixed prefix (system prompt + tool declarations) a context cache would hold
+    prefix_tokens = count_tokens(sys_prompt + (str(gemini_tools) if gemini_tools else ""))
+    return decls, sys_prompt, gemini_tools, prefix_tokens
+
+_CACHE_UNSUPPORTED_MODELS = set() # Model names whose CachedContent.create failed; not retried this process
+
 
 def list_available_models(api_key):
     try:
@@ -51,24 +303,33 @@ class GeminiModel:
         self.current_model_name = model_name
         self.console = console
         genai.configure(api_key=api_key)
+        self._compaction_model = None # Lazily created, see _summarize_for_history
+        self._summary_cache = {} # sha1(prompt + text) -> summary
+        self._obs_archive = {} # observation id -> uncompressed tool output, see _maybe_compress_observation
+        self._obs_seq = 0
+        # Tool instances are stateless, so one per name is reused for the model's lifetime
+        self._tool_cache = {name: get_tool(name) for name in PRELOADED_TOOLS if name in AVAILABLE_TOOLS}
+        # Orientation `ls` reuse: (cwd, cwd mtime) of the last listing, and the listing itself
+        self._last_ls_fingerprint: tuple[str, float] | None = None
+        self._last_ls_result: str | None = None
 
         self.generation_config = genai.types.GenerationConfig(temperature=0.4, top_p=0.95, top_k=40)
         self.safety_settings = { "HARASSMENT": "BLOCK_MEDIUM_AND_ABOVE", "HATE": "BLOCK_MEDIUM_AND_ABOVE", "SEXUAL": "BLOCK_MEDIUM_AND_ABOVE", "DANGEROUS": "BLOCK_MEDIUM_AND_ABOVE" }
         
-        # --- Tool Definition ---
-        self.function_declarations = self._create_tool_definitions()
-        self.gemini_tools = Tool(function_declarations=self.function_declarations) if self.function_declarations else None
-        # ---
-
-        # --- System Prompt (Native Functions & Planning) ---
-        self.system_instruction = self._create_system_prompt()
+        # --- Tool Definition and System Prompt (built once per process and shared across instances) ---
+        self.function_declarations, self.system_instruction, self.gemini_tools, self._prefix_tokens = _tool_setup()
         # ---
 
         # --- Initialize Persistent History ---
-        self.chat_history = [
-            {'role': 'user', 'parts': [self.system_instruction]},
-            {'role': 'model', 'parts': ["Okay, I'm ready. Provide the directory context and your request."]}
-        ]
+        # Entries carry private bookkeeping ('_tok', '_content', ...); only _request_contents() is sent
+        # History is a fixed head (never evicted) and a bounded tail; read it via the chat_history property
+        # and change it only through the helpers below. The head is empty: the system prompt goes to the
+        # model as its system_instruction (directly or through the context cache), not into contents.
+        self._history_head = ()
+        self._history_tail = collections.deque(maxlen=MAX_HISTORY_TAIL_ITEMS)
+        self._history_view = None # Cached tuple for chat_history, reset on every change
+        self._last_model_entry = None # Newest model entry with a text part, for _find_last_model_text
+        self._history_tokens = sum(h['_tok'] for h in self._history_head) # Running sum of '_tok'
         log.info("Initialized persistent chat history.")
         # ---
 
@@ -80,8 +341,24 @@ class GeminiModel:
              raise Exception(f"Could not initialize Gemini model: {e}") from e
 
     def _initialize_model_instance(self):
-        """Helper to create the GenerativeModel instance."""
+        """Helper to create the GenerativeModel instance.
+
+        Prefers a model backed by an explicit context cache holding the system prompt and tools, so
+        that fixed prefix isn't re-sent and re-billed at full rate every turn. Caching is best-effort:
+        older SDKs, models without caching support and prefixes under the API's minimum cache
+        size all fall back to a plain model. Prefixes estimated under MIN_CONTEXT_CACHE_TOKENS aren't
+        tried, and a model whose cache creation failed once isn't tried again.
+        """
         log.info(f"Initializing model instance: {self.current_model_name}")
+        self._delete_context_cache() # Replaced below (or by a plain model); don't leave it billed until its TTL
+        if self._prefix_tokens >= MIN_CONTEXT_CACHE_TOKENS and self.current_model_name not in _CACHE_UNSUPPORTED_MODELS:
+            try:
+                self._create_cached_model()
+                return
+            except Exception as cache_err:
+                self._delete_context_cache() # In case the cache was created but the model wasn't
+                _CACHE_UNSUPPORTED_MODELS.add(self.current_model_name)
+                log.info(f"Context cache unavailable for '{self.current_model_name}', sending prompt and tools per request: {cache_err}")
         try:
             # Pass system instruction here, tools are passed during generate_content
             self.model = genai.GenerativeModel(
@@ -95,39 +372,131 @@ class GeminiModel:
             log.error(f"Failed to create model instance for '{self.current_model_name}': {init_err}", exc_info=True)
             raise init_err
 
+    def _create_cached_model(self):
+        """Creates the context cache for the current model and self.model on top of it. Raises on failure."""
+        self._context_cache = genai.caching.CachedContent.create(
+            model=self.current_model_name,
+            system_instruction=self.system_instruction,
+            tools=[self.gemini_tools] if self.gemini_tools else None,
+            ttl=CONTEXT_CACHE_TTL,
+        )
+        self.model = genai.GenerativeModel.from_cached_content(
+            cached_content=self._context_cache,
+            generation_config=self.generation_config,
+            safety_settings=self.safety_settings,
+        )
+        log.info(f"Model instance '{self.current_model_name}' created from context cache {self._context_cache.name}.")
+
+    async def _generate_turn(self, contents, _retry_cache: bool = True):
+        """One agent-loop request, streamed.
+
+        Read-only tool calls are started in a thread as soon as their part arrives, while the model is
+        still emitting the rest of the turn. Returns (response, early_tasks) where early_tasks maps the
+        index of a function_call part (among the turn's function_call parts) to its running task.
+        Rebuilds the context cache once if it expired or was evicted.
+        """
+        # Tools live in the cache when there is one; the API rejects them being passed again
+        tools = None if self._context_cache else ([self.gemini_tools] if self.gemini_tools else None)
+        early_tasks = {}
+        try:
+            response = await self.model.generate_content_async(
+                contents, generation_config=self.generation_config, tools=tools, stream=True)
+            call_index = 0
+            after_mutation = False # Calls after a file-modifying call must wait for it; see _execute_tool_calls
+            async for chunk in response:
+                if not chunk.candidates or not chunk.candidates[0].content:
+                    continue
+                for part in chunk.candidates[0].content.parts:
+                    if not (hasattr(part, 'function_call') and part.function_call):
+                        continue
+                    function_call = part.function_call
+                    if not self._runs_concurrently(function_call.name):
+                        after_mutation = True # Runs alone later; nothing after it may start early either
+                    elif not after_mutation:
+                        tool_instance = self._get_tool(function_call.name)
+                        if tool_instance:
+                            log.debug(f"Starting read-only tool '{function_call.name}' before the stream ends.")
+                            # args is a Mapping already; ** unpacks it without an intermediate dict copy
+                            early_tasks[call_index] = asyncio.ensure_future(tool_instance.execute_async(**(function_call.args or {})))
+                    call_index += 1
+            return response, early_tasks
+        except (NotFound, PermissionDenied) as cache_error:
+            for task in early_tasks.values(): task.cancel()
+            if not (self._context_cache and _retry_cache):
+                raise
+            log.warning(f"Context cache {self._context_cache.name} is no longer usable ({cache_error}). Recreating.")
+            self._initialize_model_instance()
+            return await self._generate_turn(contents, _retry_cache=False)
+        except BaseException:
+            for task in early_tasks.values(): task.cancel()
+            raise
+
+    def _delete_context_cache(self):
+        """Deletes this session's cachedContents entry, if any. Best-effort: it expires with its TTL anyway."""
+        cache, self._context_cache = getattr(self, '_context_cache', None), None
+        if cache is None:
+            return
+        try:
+            cache.delete()
+            log.info(f"Deleted context cache {cache.name}.")
+        except Exception as delete_err:
+            log.warning(f"Could not delete context cache {cache.name}: {delete_err}")
+
+    def close(self):
+        """Releases server-side resources held for the session. Call once the session ends."""
+        self._delete_context_cache()
+
     def get_available_models(self):
         return list_available_models(self.api_key)
 
     # --- Native Function Calling Agent Loop ---
-    def generate(self, prompt: str) -> str | None:
-        logging.info(f"Agent Loop - Processing prompt: '{prompt[:100]}...' using model '{self.current_model_name}'")
+    async def generate(self, prompt: str) -> str | None:
+        """Runs the agent loop for one user prompt. Model calls and tool execution don't block the event loop."""
+        log.info(f"Agent Loop - Processing prompt: '{prompt[:100]}...' using model '{self.current_model_name}'")
         original_user_prompt = prompt
-        if prompt.startswith('/'):
-             command = prompt.split()[0].lower()
-             # Handle commands like /compact here eventually
-             if command in ['/exit', '/help']:
-                 logging.info(f"Handled command: {command}")
-                 return None # Or return specific help text
+        if prompt[:1] == '/':
+            # Only the first token matters; don't split a possibly large pasted prompt
+            sp = prompt.find(' ')
+            command = prompt[:sp if sp > 0 else None].lower()
+            handler = _COMMAND_HANDLERS.get(command)
+            if handler:
+                log.info(f"Handled command: {command}")
+                return await handler(self)
 
         # === Step 1: Mandatory Orientation ===
         orientation_context = ""
+        orientation_hash = None
         ls_result = None # Initialize to None
         try:
-            logging.info("Performing mandatory orientation (ls).")
-            ls_tool = get_tool("ls")
-            if ls_tool:
+            fingerprint = (os.getcwd(), os.stat('.').st_mtime)
+            if fingerprint == self._last_ls_fingerprint and self._last_ls_result is not None:
+                # Nothing added/removed here and no mutating tool ran since the last listing
+                log.info("Reusing orientation listing from the previous turn.")
+                ls_result = self._last_ls_result
+            else:
+                log.info("Performing mandatory orientation (ls).")
+                ls_tool = self._get_tool("ls")
+                if not ls_tool:
+                    log.error("CRITICAL: Could not find 'ls' tool for mandatory orientation.")
+                    # Stop execution if ls tool is missing - fundamental context is unavailable
+                    return "Error: The essential 'ls' tool is missing. Cannot proceed."
                 # Clear args just in case, assuming ls takes none for basic root listing
-                ls_result = ls_tool.execute()
+                ls_result = await ls_tool.execute_async()
                 # === START DEBUG LOGGING ===
-                log.debug(f"LsTool raw result:\n---\n{ls_result}\n---")
+                log.debug("LsTool raw result:\n---\n%s\n---", ls_result)
                 # === END DEBUG LOGGING ===
                 log.info(f"Orientation ls result length: {len(ls_result) if ls_result else 0}") # Changed from logging full result
+                ls_result = await self._maybe_compress_observation("ls", ls_result)
+                self._last_ls_fingerprint, self._last_ls_result = fingerprint, ls_result
                 self.console.print(f"[dim]Directory context acquired via 'ls'.[/dim]")
-                orientation_context = f"Current directory contents (from initial `ls`):\n```\n{ls_result}\n```\n"
+
+            orientation_hash = hash(ls_result)
+            if any(h.get('_orient') == orientation_hash for h in self.chat_history):
+                # The identical listing is still in history; don't send it twice
+                orientation_context = "[orientation unchanged since last turn]\n"
+                orientation_hash = None # Only the turn carrying the full listing is tagged
             else:
-                log.error("CRITICAL: Could not find 'ls' tool for mandatory orientation.")
-                # Stop execution if ls tool is missing - fundamental context is unavailable
-                return "Error: The essential 'ls' tool is missing. Cannot proceed."
+                orientation_context = f"Current directory contents (from initial `ls`):\n```\n{ls_result}\n```\n"
 
         except Exception as orient_error:
             log.error(f"Error during mandatory orientation (ls): {orient_error}", exc_info=True)
@@ -142,11 +511,12 @@ class GeminiModel:
         turn_input_prompt = f"{orientation_context}\nUser request: {original_user_prompt}"
         
         # Add this combined input to the PERSISTENT history
-        self.chat_history.append({'role': 'user', 'parts': [turn_input_prompt]})
+        turn_entry = self._append_history('user', turn_input_prompt)
+        if orientation_hash is not None:
+            turn_entry['_orient'] = orientation_hash # Dropped if this entry is later compacted away
         # === START DEBUG LOGGING ===
-        log.debug(f"Prepared turn_input_prompt (sent to LLM):\n---\n{turn_input_prompt}\n---")
+        log.debug("Prepared turn_input_prompt (sent to LLM):\n---\n%s\n---", turn_input_prompt)
         # === END DEBUG LOGGING ===
-        self._manage_context_window() # Truncate *before* sending the first request
 
         iteration_count = 0
         task_completed = False
@@ -156,24 +526,25 @@ class GeminiModel:
         try:
             while iteration_count < MAX_AGENT_ITERATIONS:
                 iteration_count += 1
-                logging.info(f"Agent Loop Iteration {iteration_count}/{MAX_AGENT_ITERATIONS}")
+                log.info(f"Agent Loop Iteration {iteration_count}/{MAX_AGENT_ITERATIONS}")
+                # Once per iteration, after all of the previous turn's parts and responses were appended.
+                # Compressing may call the summarizer, so it runs off the event loop
+                await asyncio.to_thread(self._manage_context_window)
                 
                 # === Call LLM with History and Tools ===
                 llm_response = None
+                early_tasks = {}
                 try:
-                    logging.info(f"Sending request to LLM ({self.current_model_name}). History length: {len(self.chat_history)} turns.")
+                    log.info(f"Sending request to LLM ({self.current_model_name}). History length: {len(self.chat_history)} turns.")
                     # === ADD STATUS FOR LLM CALL ===
                     with self.console.status(f"[yellow]Assistant thinking ({self.current_model_name})...", spinner="dots"):
-                        # Pass the available tools to the generate_content call
-                        llm_response = self.model.generate_content(
-                            self.chat_history,
-                            generation_config=self.generation_config,
-                            tools=[self.gemini_tools] if self.gemini_tools else None
-                        )
+                        # Tools are passed here, or come from the context cache
+                        llm_response, early_tasks = await self._generate_turn(self._request_contents())
                     # === END STATUS ===
                     
                     # === START DEBUG LOGGING ===
-                    log.debug(f"RAW Gemini Response Object (Iter {iteration_count}): {llm_response}")
+                    # Lazy %-args: the response repr can be megabytes and is only built if DEBUG is on
+                    log.debug("RAW Gemini Response Object (Iter %d): %s", iteration_count, llm_response)
                     # === END DEBUG LOGGING ===
                     
                     # Extract the response part (candidate)
@@ -190,160 +561,53 @@ class GeminiModel:
                         task_completed = True; final_summary = last_text_response; break
 
                     # --- REVISED LOOP LOGIC FOR MULTI-PART HANDLING ---
-                    function_call_part_to_execute = None
+                    pending_calls = [] # Every function_call in this response, in order
+                    model_parts = [] # The whole candidate goes into history as one 'model' entry
                     text_response_buffer = ""
-                    processed_function_call_in_turn = False # Flag to ensure only one function call is processed per turn
 
                     # Iterate through all parts in the response
                     for part in response_candidate.content.parts:
-                        if hasattr(part, 'function_call') and part.function_call and not processed_function_call_in_turn:
+                        if hasattr(part, 'function_call') and part.function_call:
                             function_call = part.function_call
-                            tool_name = function_call.name
-                            tool_args = dict(function_call.args) if function_call.args else {}
-                            log.info(f"LLM requested Function Call: {tool_name} with args: {tool_args}")
-
-                            # Add the function *call* part to history immediately
-                            self.chat_history.append({'role': 'model', 'parts': [part]})
-                            self._manage_context_window()
-                            
-                            # Store details for execution after processing all parts
-                            function_call_part_to_execute = part 
-                            processed_function_call_in_turn = True # Mark that we found and will process a function call
-                            # Don't break here yet, process other parts (like text) first for history/logging
+                            log.info("LLM requested Function Call: %s with args: %s", function_call.name, function_call.args)
+                            model_parts.append(part)
+                            pending_calls.append(function_call)
 
                         elif hasattr(part, 'text') and part.text:
                             llm_text = part.text
                             log.info(f"LLM returned text part (Iter {iteration_count}): {llm_text[:100]}...")
                             text_response_buffer += llm_text + "\n" # Append text parts
-                            # Add the text response part to history
-                            self.chat_history.append({'role': 'model', 'parts': [part]})
-                            self._manage_context_window()
+                            model_parts.append(part)
                             
                         else:
                             log.warning(f"LLM returned unexpected response part (Iter {iteration_count}): {part}")
                             # Add it to history anyway?
-                            self.chat_history.append({'role': 'model', 'parts': [part]})
-                            self._manage_context_window()
+                            model_parts.append(part)
+
+                    # One 'model' entry for all parts: the API requires the next 'user' turn to hold
+                    # exactly one function_response per function_call in the turn right before it
+                    self._append_history('model', *model_parts)
 
                     # --- Now, decide action based on processed parts ---
-                    if function_call_part_to_execute:
-                        # === Execute the Tool === (Using stored details)
-                        function_call = function_call_part_to_execute.function_call # Get the stored call
-                        tool_name = function_call.name
-                        tool_args = dict(function_call.args) if function_call.args else {}
-                        
-                        tool_result = ""
-                        tool_error = False
-                        user_rejected = False # Flag for user rejection
-                        
-                        # --- HUMAN IN THE LOOP CONFIRMATION ---
-                        if tool_name in ["edit", "create_file"]: 
-                            file_path = tool_args.get("file_path", "(unknown file)")
-                            content = tool_args.get("content") # Get content, might be None
-                            old_string = tool_args.get("old_string") # Get old_string
-                            new_string = tool_args.get("new_string") # Get new_string
-                            
-                            panel_content = f"[bold yellow]Proposed change:[/bold yellow]\n[cyan]Tool:[/cyan] {tool_name}\n[cyan]File:[/cyan] {file_path}\n"
-                            
-                            if content is not None: # Case 1: Full content provided
-                                # Prepare content preview (limit length?)
-                                preview_lines = content.splitlines()
-                                max_preview_lines = 30 # Limit preview for long content
-                                if len(preview_lines) > max_preview_lines:
-                                    content_preview = "\n".join(preview_lines[:max_preview_lines]) + f"\n... ({len(preview_lines) - max_preview_lines} more lines)"
-                                else:
-                                    content_preview = content
-                                panel_content += f"\n[bold]Content Preview:[/bold]\n---\n{content_preview}\n---"
-                                
-                            elif old_string is not None and new_string is not None: # Case 2: Replacement
-                                max_snippet = 50 # Max chars to show for old/new strings
-                                old_snippet = old_string[:max_snippet] + ('...' if len(old_string) > max_snippet else '')
-                                new_snippet = new_string[:max_snippet] + ('...' if len(new_string) > max_snippet else '')
-                                panel_content += f"\n[bold]Action:[/bold] Replace occurrence of:\n---\n{old_snippet}\n---\n[bold]With:[/bold]\n---\n{new_snippet}\n---"
-                            else: # Case 3: Other/Unknown edit args
-                                 panel_content += "\n[italic](Preview not available for this edit type)"
-
-                            # Use Rich Panel for better presentation
-                            self.console.print(Panel(
-                                panel_content, # Use the constructed content
-                                title="Confirm File Modification",
-                                border_style="red",
-                                expand=False
-                            ))
-                            
-                            # Use questionary for confirmation
-                            confirmed = questionary.confirm(
-                                "Apply this change?", 
-                                default=False, # Default to No
-                                auto_enter=False # Require Enter key press
-                            ).ask()
-                            
-                            # Handle case where user might Ctrl+C during prompt
-                            if confirmed is None: 
-                                log.warning("User cancelled confirmation prompt.")
-                                tool_result = f"User cancelled confirmation for {tool_name} on {file_path}."
-                                user_rejected = True
-                            elif not confirmed: # User explicitly selected No
-                                log.warning(f"User rejected proposed action: {tool_name} on {file_path}")
-                                tool_result = f"User rejected the proposed {tool_name} operation on {file_path}."
-                                user_rejected = True # Set flag to skip execution
-                            else: # User selected Yes
-                                log.info(f"User confirmed action: {tool_name} on {file_path}")
-                        # --- END CONFIRMATION ---
-
-                        # Only execute if not rejected by user
-                        if not user_rejected:
-                            status_msg = f"Executing {tool_name}"
-                            if tool_args: status_msg += f" ({', '.join([f'{k}={str(v)[:30]}...' if len(str(v))>30 else f'{k}={v}' for k,v in tool_args.items()])})"
-                            
-                            with self.console.status(f"[yellow]{status_msg}...", spinner="dots"):
-                                try:
-                                    tool_instance = get_tool(tool_name)
-                                    if tool_instance:
-                                        log.debug(f"Executing tool '{tool_name}' with arguments: {tool_args}")
-                                        # --- Dependency Injection for Tools that need the model ---
-                                        if tool_name == "summarize_code":
-                                            tool_args['model_instance'] = self.model
-                                        # ---
-                                        tool_result = tool_instance.execute(**tool_args)
-                                        log.info(f"Tool '{tool_name}' executed. Result length: {len(str(tool_result)) if tool_result else 0}")
-                                        log.debug(f"Tool '{tool_name}' result: {str(tool_result)[:500]}...")
-                                    else:
-                                        log.error(f"Tool '{tool_name}' not found.")
-                                        tool_result = f"Error: Tool '{tool_name}' is not available."
-                                        tool_error = True
-                                except Exception as tool_exec_error:
-                                    log.error(f"Error executing tool '{tool_name}' with args {tool_args}: {tool_exec_error}", exc_info=True)
-                                    tool_result = f"Error executing tool {tool_name}: {str(tool_exec_error)}"
-                                    tool_error = True
-                                
-                                # --- Print Executed/Error INSIDE the status block ---
-                                if tool_error:
-                                    self.console.print(f"[red] -> Error executing {tool_name}: {str(tool_result)[:100]}...[/red]")
-                                else:
-                                    self.console.print(f"[dim] -> Executed {tool_name}[/dim]") 
-                            # --- End Status Block ---
-                                
-                        # === Check for Task Completion Signal via Tool Call ===
-                        if tool_name == "task_complete":
-                            log.info("Task completion signaled by 'task_complete' function call.")
-                            task_completed = True
-                            final_summary = tool_result # The result of task_complete IS the summary
-                            # We break *after* adding the function response below
-                        
-                        # === Add Function Response to History ===
-                        # Create the FunctionResponse proto
-                        function_response_proto = protos.FunctionResponse(
-                            name=tool_name,
-                            response={"result": tool_result} # API expects dict
-                        )
-                        # Wrap it in a Part proto
-                        response_part_proto = protos.Part(function_response=function_response_proto)
-                        
-                        # Append to history
-                        self.chat_history.append({'role': 'user', # Function response acts as a 'user' turn providing data
-                                              'parts': [response_part_proto]})
-                        self._manage_context_window()
+                    if pending_calls:
+                        # === Execute the Tools ===
+                        tool_results = await self._execute_tool_calls(pending_calls, early_tasks)
+
+                        response_parts = []
+                        for function_call, tool_result in zip(pending_calls, tool_results):
+                            tool_name = function_call.name
+                            # === Check for Task Completion Signal via Tool Call ===
+                            if tool_name == "task_complete":
+                                log.info("Task completion signaled by 'task_complete' function call.")
+                                task_completed = True
+                                final_summary = tool_result # The result of task_complete IS the summary
+                                # We break *after* adding the function response below
+                            tool_result = await self._maybe_compress_observation(tool_name, tool_result)
+                            response_parts.append(_function_response_part(tool_name, tool_result))
+
+                        # === Add Function Responses to History ===
+                        # One 'user' turn carries every response; the API pairs them with the calls by order
+                        self._append_history('user', *response_parts)
                         
                         if task_completed: 
                             break # Exit loop NOW that task_complete result is in history
@@ -369,38 +633,36 @@ class GeminiModel:
                 except ResourceExhausted as quota_error:
                     log.warning(f"Quota exceeded for model '{self.current_model_name}': {quota_error}")
                     # Check if we are already using the fallback
-                    if self.current_model_name == self.FALLBACK_MODEL:
+                    if self.current_model_name == FALLBACK_MODEL:
                         log.error("Quota exceeded even for the fallback model. Cannot proceed.")
                         self.console.print(f"[bold red]API quota exceeded for primary and fallback models. Please check your plan/billing.[/bold red]")
                         # Clean history before returning
-                        if self.chat_history[-1]['role'] == 'user': self.chat_history.pop()
+                        if self.chat_history[-1]['role'] == 'user': self._pop_history()
                         return f"Error: API quota exceeded for primary and fallback models."
                     else:
-                        log.info(f"Switching to fallback model: {self.FALLBACK_MODEL}")
-                        self.console.print(f"[bold yellow]Quota limit reached for {self.current_model_name}. Switching to fallback model ({self.FALLBACK_MODEL})...[/bold yellow]")
-                        self.current_model_name = self.FALLBACK_MODEL
+                        log.info(f"Switching to fallback model: {FALLBACK_MODEL}")
+                        self.console.print(f"[bold yellow]Quota limit reached for {self.current_model_name}. Switching to fallback model ({FALLBACK_MODEL})...[/bold yellow]")
+                        self.current_model_name = FALLBACK_MODEL
                         try:
                             self._initialize_model_instance() # Recreate model instance with fallback name
                             log.info(f"Successfully switched to and initialized fallback model: {self.current_model_name}")
-                            # Important: Clear the last model response (which caused the error) before retrying
-                            if self.chat_history[-1]['role'] == 'model': 
-                               last_part = self.chat_history[-1]['parts'][0]
-                               # Only pop if it was a failed function call attempt or empty text response leading to error
-                               if hasattr(last_part, 'function_call') or not hasattr(last_part, 'text') or not last_part.text:
-                                   self.chat_history.pop() 
-                                   log.debug("Removed last model part before retrying with fallback.")
+                            # Important: Clear trailing model parts (which caused the error) before retrying
+                            tail = self._history_tail
+                            while tail and tail[-1]['role'] == 'model' and all(_is_failed_model_part(p) for p in tail[-1]['parts']):
+                                self._pop_history()
+                                log.debug("Removed trailing model part before retrying with fallback.")
                             continue # Retry the current loop iteration with the new model
                         except Exception as fallback_init_error:
-                            log.error(f"Failed to initialize fallback model '{self.FALLBACK_MODEL}': {fallback_init_error}", exc_info=True)
+                            log.error(f"Failed to initialize fallback model '{FALLBACK_MODEL}': {fallback_init_error}", exc_info=True)
                             self.console.print(f"[bold red]Error switching to fallback model: {fallback_init_error}[/bold red]")
-                            if self.chat_history[-1]['role'] == 'user': self.chat_history.pop()
+                            if self.chat_history[-1]['role'] == 'user': self._pop_history()
                             return f"Error: Failed to initialize fallback model after quota error."
 
                 except Exception as generation_error:
                      # This handles other errors during the generate_content call or loop logic
                      log.error(f"Error during Agent Loop: {generation_error}", exc_info=True)
                      # Clean history
-                     if self.chat_history[-1]['role'] == 'user': self.chat_history.pop()
+                     if self.chat_history[-1]['role'] == 'user': self._pop_history()
                      return f"Error during agent processing: {generation_error}"
 
             # === End Agent Loop ===
@@ -427,110 +689,384 @@ class GeminiModel:
              log.error(f"Error during Agent Loop: {str(e)}", exc_info=True)
              return f"An unexpected error occurred during the agent process: {str(e)}"
 
-    # --- Context Management (Consider Token Counting) ---
-    def _manage_context_window(self):
-        """Basic context window management based on turn count."""
-        # Placeholder - Enhance with token counting
-        MAX_HISTORY_TURNS = 20 # Keep ~N pairs of user/model turns + initial setup + tool calls/responses
-        # Each full LLM round (request + function_call + function_response) adds 3 items
-        if len(self.chat_history) > (MAX_HISTORY_TURNS * 3 + 2): 
-             log.warning(f"Chat history length ({len(self.chat_history)}) exceeded threshold. Truncating.")
-             # Keep system prompt (idx 0), initial model ack (idx 1)
-             keep_count = MAX_HISTORY_TURNS * 3 # Keep N rounds
-             keep_from_index = len(self.chat_history) - keep_count
-             self.chat_history = self.chat_history[:2] + self.chat_history[keep_from_index:]
-             log.info(f"History truncated to {len(self.chat_history)} items.")
-
-    # --- Tool Definition Helper ---
-    def _create_tool_definitions(self) -> list[FunctionDeclaration] | None:
-        """Dynamically create FunctionDeclarations from AVAILABLE_TOOLS."""
-        declarations = []
-        for tool_name, tool_instance in AVAILABLE_TOOLS.items():
-            if hasattr(tool_instance, 'get_function_declaration'):
-                declaration = tool_instance.get_function_declaration()
-                if declaration:
-                    declarations.append(declaration)
-                    log.debug(f"Generated FunctionDeclaration for tool: {tool_name}")
-                else:
-                    log.warning(f"Tool {tool_name} has 'get_function_declaration' but it returned None.")
+    # --- Tool Execution ---
+    def _get_tool(self, name: str):
+        """Tool instance for `name` (None if unavailable), created on first use and then reused."""
+        try:
+            return self._tool_cache[name]
+        except KeyError:
+            return self._tool_cache.setdefault(name, get_tool(name))
+
+    def _runs_concurrently(self, name: str) -> bool:
+        """True if calls to `name` may start early and run alongside other calls: a read-only tool
+        that exists and whose class doesn't set `thread_safe = False`."""
+        tool_instance = self._get_tool(name)
+        return name in READ_ONLY_TOOLS and tool_instance is not None and tool_instance.thread_safe
+
+    async def _execute_tool_calls(self, function_calls: list, early_tasks: dict) -> list:
+        """Executes one response's function calls and returns their results, in call order.
+
+        Runs of consecutive read-only calls execute concurrently (at most MAX_PARALLEL_TOOL_CALLS
+        at a time) under one status line. Any other call is a barrier: it runs alone, after every
+        call before it, so e.g. a `view` issued after an `edit` sees the edited file. A read-only
+        tool whose class sets `thread_safe = False` is treated the same way.
+        """
+        results = [None] * len(function_calls)
+        semaphore = asyncio.Semaphore(MAX_PARALLEL_TOOL_CALLS)
+
+        async def run_limited(index, function_call):
+            async with semaphore:
+                results[index] = await self._execute_tool_call(function_call, early_tasks.pop(index, None), show_status=False)
+
+        def concurrent_ok(function_call):
+            return self._runs_concurrently(function_call.name)
+
+        index = 0
+        while index < len(function_calls):
+            if not concurrent_ok(function_calls[index]):
+                results[index] = await self._execute_tool_call(function_calls[index], early_tasks.pop(index, None))
+                index += 1
+                continue
+            batch_end = index
+            while batch_end < len(function_calls) and concurrent_ok(function_calls[batch_end]):
+                batch_end += 1
+            if batch_end - index == 1:
+                results[index] = await self._execute_tool_call(function_calls[index], early_tasks.pop(index, None))
             else:
-                # Fallback or skip tools without the method? For now, log warning.
-                log.warning(f"Tool {tool_name} does not have a 'get_function_declaration' method. Skipping.")
+                names = ", ".join(fc.name for fc in function_calls[index:batch_end])
+                with self.console.status(f"[yellow]Executing {batch_end - index} tools in parallel ({names})...", spinner="dots"):
+                    await asyncio.gather(*(run_limited(i, function_calls[i]) for i in range(index, batch_end)))
+            index = batch_end
+
+        for task in early_tasks.values(): task.cancel() # Started mid-stream but never claimed
+        return results
+
+    async def _execute_tool_call(self, function_call, prefetched=None, show_status: bool = True) -> str:
+        """Confirms (for file modifications) and executes one function call. Returns the tool result.
+
+        `prefetched` is the task for this call if it was already started while the response streamed.
+        """
+        tool_name = function_call.name
+        # Read-only view of the call's args (a Mapping); never mutated, so no dict copy is needed
+        tool_args = function_call.args or {}
         
-        log.info(f"Created {len(declarations)} function declarations for native tool use.")
-        return declarations if declarations else None
-
-    # --- System Prompt Helper ---
-    def _create_system_prompt(self) -> str:
-        """Creates the system prompt, emphasizing native functions and planning."""
-        # Use docstrings from tools if possible for descriptions
-        tool_descriptions = []
-        if self.function_declarations:
-            for func_decl in self.function_declarations:
-                 # Simple representation: name(args) - description
-                 # Ensure parameters exist before trying to access properties
-                 args_str = ""
-                 if func_decl.parameters and func_decl.parameters.properties:
-                      args_list = []
-                      required_args = func_decl.parameters.required or []
-                      for prop, details in func_decl.parameters.properties.items():
-                            # Access attributes directly from the Schema object
-                            prop_type = details.type if hasattr(details, 'type') else 'UNKNOWN' 
-                            prop_desc = details.description if hasattr(details, 'description') else ''
-                            
-                            suffix = "" if prop in required_args else "?" # Indicate optional args
-                            
-                            # Include parameter description in the string for clarity in the system prompt
-                            args_list.append(f"{prop}: {prop_type}{suffix} # {prop_desc}") 
-                            
-                      args_str = ", ".join(args_list)
-                 
-                 desc = func_decl.description or "(No description provided)" # Overall func desc
-                 tool_descriptions.append(f"- `{func_decl.name}({args_str})`: {desc}")
+        tool_result = ""
+        tool_error = False
+        user_rejected = False # Flag for user rejection
+
+        # --- HUMAN IN THE LOOP CONFIRMATION ---
+        if tool_name in ["edit", "create_file"]: 
+            file_path = tool_args.get("file_path", "(unknown file)")
+            content = tool_args.get("content") # Get content, might be None
+            old_string = tool_args.get("old_string") # Get old_string
+            new_string = tool_args.get("new_string") # Get new_string
+
+            panel_content = f"[bold yellow]Proposed change:[/bold yellow]\n[cyan]Tool:[/cyan] {tool_name}\n[cyan]File:[/cyan] {file_path}\n"
+
+            if content is not None: # Case 1: Full content provided
+                content_preview = _content_preview(content, max_lines=30) # Limit preview for long content
+                panel_content += f"\n[bold]Content Preview:[/bold]\n---\n{content_preview}\n---"
+
+            elif old_string is not None and new_string is not None: # Case 2: Replacement
+                old_snippet = _snippet(old_string, 50) # Max chars to show for old/new strings
+                new_snippet = _snippet(new_string, 50)
+                panel_content += f"\n[bold]Action:[/bold] Replace occurrence of:\n---\n{old_snippet}\n---\n[bold]With:[/bold]\n---\n{new_snippet}\n---"
+            else: # Case 3: Other/Unknown edit args
+                 panel_content += "\n[italic](Preview not available for this edit type)"
+
+            # Use Rich Panel for better presentation
+            self.console.print(Panel(
+                panel_content, # Use the constructed content
+                title="Confirm File Modification",
+                border_style="red",
+                expand=False
+            ))
+
+            # Use questionary for confirmation
+            confirmed = await questionary.confirm(
+                "Apply this change?", 
+                default=False, # Default to No
+                auto_enter=False # Require Enter key press
+            ).ask_async()
+
+            # Handle case where user might Ctrl+C during prompt
+            if confirmed is None: 
+                log.warning("User cancelled confirmation prompt.")
+                tool_result = f"User cancelled confirmation for {tool_name} on {file_path}."
+                user_rejected = True
+            elif not confirmed: # User explicitly selected No
+                log.warning(f"User rejected proposed action: {tool_name} on {file_path}")
+                tool_result = f"User rejected the proposed {tool_name} operation on {file_path}."
+                user_rejected = True # Set flag to skip execution
+            else: # User selected Yes
+                log.info(f"User confirmed action: {tool_name} on {file_path}")
+        # --- END CONFIRMATION ---
+
+        # Only execute if not rejected by user
+        if not user_rejected:
+            status_msg = f"Executing {tool_name}"
+            if tool_args:
+                summarize = tool_name in LARGE_PAYLOAD_TOOLS
+                status_msg += f" ({', '.join(_fmt_arg(k, v, summarize) for k, v in tool_args.items())})"
+
+            # Parallel batches share one status line set up by the caller (rich allows only one at a time)
+            with self.console.status(f"[yellow]{status_msg}...", spinner="dots") if show_status else contextlib.nullcontext():
+                try:
+                    tool_instance = self._get_tool(tool_name)
+                    if tool_instance:
+                        log.debug("Executing tool '%s' with arguments: %s", tool_name, tool_args)
+                        # --- Dependency Injection for Tools that need the model ---
+                        extra_args = {'model_instance': self.model} if tool_name == "summarize_code" else {}
+                        # ---
+                        if prefetched is not None:
+                            tool_result = await prefetched
+                        else:
+                            # Subprocess tools await their child natively; the rest run in a worker thread
+                            tool_result = await tool_instance.execute_async(**tool_args, **extra_args)
+                        # One string conversion, reused for logging and the FunctionResponse
+                        tool_result = tool_result if isinstance(tool_result, str) else str(tool_result)
+                        log.info(f"Tool '{tool_name}' executed. Result length: {len(tool_result)}")
+                        log.debug("Tool '%s' result: %.500s...", tool_name, tool_result)
+                    else:
+                        log.error(f"Tool '{tool_name}' not found.")
+                        tool_result = f"Error: Tool '{tool_name}' is not available."
+                        tool_error = True
+                except Exception as tool_exec_error:
+                    log.error(f"Error executing tool '{tool_name}' with args {tool_args}: {tool_exec_error}", exc_info=True)
+                    tool_result = f"Error executing tool {tool_name}: {str(tool_exec_error)}"
+                    tool_error = True
+
+                # --- Print Executed/Error INSIDE the status block ---
+                if tool_error:
+                    self.console.print(f"[red] -> Error executing {tool_name}: {str(tool_result)[:100]}...[/red]")
+                else:
+                    self.console.print(f"[dim] -> Executed {tool_name}[/dim]") 
+            # --- End Status Block ---
+
+        if tool_name not in READ_ONLY_TOOLS:
+            self._last_ls_fingerprint = None # File sizes/mtimes in the cached listing may be stale now
+            from ..tools.file_tools import clear_glob_cache
+            clear_glob_cache() # Files may have been created or removed below the glob roots
+        return tool_result
+
+    # --- Observation Compression ---
+    async def _maybe_compress_observation(self, tool_name: str, text):
+        """Returns a tool output as it should enter history: unchanged, or compressed if it's over OBS_TOKEN_THRESHOLD.
+
+        `ls` keeps the first entries of each kind, `view` keeps head and tail, anything else is
+        summarized by COMPACTION_MODEL (head and tail if that fails). The original is kept in
+        self._obs_archive under the id quoted in the compressed text.
+        """
+        if not isinstance(text, str) or tool_name == "task_complete":
+            return text
+        tokens = _estimate_tokens_fast(text)
+        if tokens <= OBS_TOKEN_THRESHOLD:
+            return text
+
+        if tool_name == "ls":
+            compressed = _compress_ls_output(text, OBS_LS_MAX_ENTRIES)
+        elif tool_name == "view":
+            compressed = _elide_middle(text, OBS_HEAD_TAIL_LINES)
         else:
-             tool_descriptions.append(" - (No tools available with function declarations)")
+            try:
+                compressed = await asyncio.to_thread(self._summarize_for_history, text, OBS_SUMMARY_PROMPT)
+            except Exception as summary_error:
+                log.warning(f"Could not summarize '{tool_name}' output, eliding instead: {summary_error}")
+                compressed = _elide_middle(text, OBS_HEAD_TAIL_LINES)
 
-        tool_list_str = "\n".join(tool_descriptions)
+        self._obs_seq += 1
+        self._obs_archive[self._obs_seq] = text
+        if len(self._obs_archive) > MAX_ARCHIVED_OBSERVATIONS:
+            del self._obs_archive[next(iter(self._obs_archive))]
+        log.info(f"Compressed '{tool_name}' output from ~{tokens} to ~{_estimate_tokens_fast(compressed)} tokens (observation #{self._obs_seq}).")
+        return f"{compressed}\n[Output compressed from ~{tokens} tokens; full text archived as observation #{self._obs_seq}]"
 
-        # Prompt v13.1 - Native Functions, Planning, Accurate Context
-        return f"""You are Gemini Code, an AI coding assistant running in a CLI environment.
-Your goal is to help the user with their coding tasks by understanding their request, planning the necessary steps, and using the available tools via **native function calls**.
+    # --- History Helpers ---
+    @property
+    def chat_history(self) -> tuple[dict, ...]:
+        """Read-only view of the whole history (head + tail), rebuilt only after it changes."""
+        if self._history_view is None:
+            self._history_view = self._history_head + tuple(self._history_tail)
+        return self._history_view
 
-Available Tools (Use ONLY these via function calls):
-{tool_list_str}
+    def _append_history(self, role: str, *parts):
+        """Appends a turn to the history tail, caching its token estimate. Returns the new entry."""
+        if len(self._history_tail) == self._history_tail.maxlen:
+            # Evict ourselves rather than let the deque drop an item silently: keeps the total and pairs right
+            self._history_tokens -= self._evict_oldest()
+        entry = _make_history_entry(role, *parts)
+        self._history_tail.append(entry)
+        if role == 'model' and _entry_model_text(entry):
+            self._last_model_entry = entry
+        self._history_tokens += entry['_tok']
+        self._history_view = None
+        return entry
 
-Workflow:
-1.  **Analyze & Plan:** Understand the user's request based on the provided directory context (`ls` output) and the request itself. For non-trivial tasks, **first outline a brief plan** of the steps and tools you will use in a text response. **Note:** Actions that modify files (`edit`, `create_file`) will require user confirmation before execution.
-2.  **Execute:** If a plan is not needed or after outlining the plan, make the **first necessary function call** to execute the next step (e.g., `view` a file, `edit` a file, `grep` for text, `tree` for structure).
-3.  **Observe:** You will receive the result of the function call (or a message indicating user rejection). Use this result to inform your next step.
-4.  **Repeat:** Based on the result, make the next function call required to achieve the user's goal. Continue calling functions sequentially until the task is complete.
-5.  **Complete:** Once the *entire* task is finished, **you MUST call the `task_complete` function**, providing a concise summary of what was done in the `summary` argument. 
-    *   The `summary` argument MUST accurately reflect the final outcome (success, partial success, error, or what was done).
-    *   Format the summary using **Markdown** for readability (e.g., use backticks for filenames `like_this.py` or commands `like this`).
-    *   If code was generated or modified, the summary **MUST** contain the **actual, specific commands** needed to run or test the result (e.g., show `pip install Flask` and `python app.py`, not just say "instructions provided"). Use Markdown code blocks for commands.
+    def _pop_history(self):
+        """Removes and returns the last history entry, keeping the running token total in step."""
+        if not self._history_tail:
+            return None
+        entry = self._history_tail.pop()
+        self._history_tokens -= entry['_tok']
+        if entry is self._last_model_entry:
+            self._last_model_entry = None # The scan in _find_last_model_text finds the next one back
+        self._history_view = None
+        return entry
 
-Important Rules:
-*   **Use Native Functions:** ONLY interact with tools by making function calls as defined above. Do NOT output tool calls as text (e.g., `cli_tools.ls(...)`).
-*   **Sequential Calls:** Call functions one at a time. You will get the result back before deciding the next step. Do not try to chain calls in one turn.
-*   **Initial Context Handling:** When the user asks a general question about the codebase contents (e.g., "what's in this directory?", "show me the files", "whats in this codebase?"), your **first** response MUST be a summary or list of **ALL** files and directories provided in the initial context (`ls` or `tree` output). Do **NOT** filter this initial list or make assumptions (e.g., about virtual environments). Only after presenting the full initial context should you suggest further actions or use other tools if necessary.
-*   **Accurate Context Reporting:** When asked about directory contents (like "whats in this codebase?"), accurately list or summarize **all** relevant files and directories shown in the `ls` or `tree` output, including common web files (`.html`, `.js`, `.css`), documentation (`.md`), configuration files, build artifacts, etc., not just specific source code types. Do not ignore files just because virtual environments are also present. Use `tree` for a hierarchical view if needed.
-*   **Handling Explanations:** 
-    *   If the user asks *how* to do something, asks for an explanation, or requests instructions (like "how do I run this?"), **provide the explanation or instructions directly in a text response** using clear Markdown formatting.
-    *   **Proactive Assistance:** When providing instructions that culminate in a specific execution command (like `python file.py`, `npm start`, `git status | cat`, etc.), first give the full explanation, then **explicitly ask the user if they want you to run that final command** using the `execute_command` tool. 
-        *   Example: After explaining how to run `calculator.py`, you should ask: "Would you like me to run `python calculator.py | cat` for you using the `execute_command` tool?" (Append `| cat` for commands that might page).
-    *   Do *not* use `task_complete` just for providing information; only use it when the *underlying task* (e.g., file creation, modification) is fully finished.
-*   **Planning First:** For tasks requiring multiple steps (e.g., read file, modify content, write file), explain your plan briefly in text *before* the first function call.
-*   **Precise Edits:** When editing files (`edit` tool), prefer viewing the relevant section first (`view` tool with offset/limit), then use exact `old_string`/`new_string` arguments if possible. Only use the `content` argument for creating new files or complete overwrites.
-*   **Task Completion Signal:** ALWAYS finish action-oriented tasks by calling `task_complete(summary=...)`. 
-    *   The `summary` argument MUST accurately reflect the final outcome (success, partial success, error, or what was done).
-    *   Format the summary using **Markdown** for readability (e.g., use backticks for filenames `like_this.py` or commands `like this`).
-    *   If code was generated or modified, the summary **MUST** contain the **actual, specific commands** needed to run or test the result (e.g., show `pip install Flask` and `python app.py`, not just say "instructions provided"). Use Markdown code blocks for commands.
+    def _evict_oldest(self) -> int:
+        """Drops the oldest tail entry, plus the function_response entry it leaves orphaned. Returns the tokens removed."""
+        tail = self._history_tail
+        removed = tail.popleft()['_tok']
+        # Calls and their responses are one 'model' entry and the 'user' entry after it: a response
+        # entry whose call entry was just evicted would be rejected by the API, so it goes too
+        while tail and _entry_has(tail[0], "function_response"):
+            removed += tail.popleft()['_tok']
+        self._history_view = None
+        return removed
 
-The user's first message will contain initial directory context and their request."""
+    def _refine_token_counts(self) -> int:
+        """Replaces heuristic '_tok' values with exact counts. Only used near the budget boundary."""
+        pending = [entry for entry in self.chat_history if not entry.get('_exact')]
+        # One batched encode call for every entry still carrying an estimate
+        for entry, tokens in zip(pending, count_tokens_batch([_entry_text(entry) for entry in pending])):
+            entry['_tok'] = tokens
+            entry['_exact'] = True
+        total_tokens = sum(entry['_tok'] for entry in self.chat_history)
+        self._history_tokens = total_tokens
+        return total_tokens
+
+    def _request_contents(self) -> list[protos.Content]:
+        """chat_history as sent to the API. Each entry is converted to protos.Content once and reused,
+        so a turn only pays serialization for the items added since the previous request."""
+        contents = []
+        for h in self.chat_history:
+            content = h.get('_content')
+            if content is None:
+                parts = [protos.Part(text=p) if isinstance(p, str) else p for p in h['parts']]
+                content = h['_content'] = protos.Content(role=h['role'], parts=parts)
+            contents.append(content)
+        return contents
+
+    # --- Context Management (Token Budget) ---
+    def _manage_context_window(self):
+        """Evicts the oldest turns until history fits CONTEXT_TRUNCATION_THRESHOLD_TOKENS.
+
+        The last KEEP_LAST_HISTORY_ITEMS items are always kept, and a function_call is never kept without its function_response (or vice versa).
+        """
+        total_tokens = self._history_tokens
+        if total_tokens < CONTEXT_TRUNCATION_THRESHOLD_TOKENS * (1 - EXACT_COUNT_MARGIN):
+            return
+        if total_tokens <= CONTEXT_TRUNCATION_THRESHOLD_TOKENS * (1 + EXACT_COUNT_MARGIN):
+            # Too close to call on the heuristic alone
+            total_tokens = self._refine_token_counts()
+            if total_tokens <= CONTEXT_TRUNCATION_THRESHOLD_TOKENS:
+                return
+
+        log.warning(f"Chat history (~{total_tokens} tokens) exceeded budget of {CONTEXT_TRUNCATION_THRESHOLD_TOKENS}. Compacting.")
+        try:
+            total_tokens = self._compact_history(total_tokens)
+        except Exception as compact_error:
+            log.warning(f"History compaction failed, falling back to truncation: {compact_error}", exc_info=True)
+            total_tokens = sum(h['_tok'] for h in self.chat_history) # Some items may already be compressed
+        self._history_tokens = total_tokens
+        if total_tokens <= CONTEXT_TRUNCATION_THRESHOLD_TOKENS:
+            return
+
+        log.warning(f"Chat history still ~{total_tokens} tokens after compaction. Truncating.")
+        while len(self._history_tail) > KEEP_LAST_HISTORY_ITEMS and total_tokens > CONTEXT_TRUNCATION_THRESHOLD_TOKENS:
+            total_tokens -= self._evict_oldest()
+        self._history_tokens = total_tokens
+        log.info(f"History truncated to {len(self.chat_history)} items (~{total_tokens} tokens).")
+
+    def _compact_history(self, total_tokens: int, budget: int = CONTEXT_TRUNCATION_THRESHOLD_TOKENS) -> int:
+        """Summarizes the middle of history (the tail, minus its last KEEP_LAST_HISTORY_ITEMS).
+
+        Level 1 replaces oversized text/function_response items with per-item summaries. If that
+        doesn't bring the total within `budget`, Level 2 collapses the whole middle span into one
+        summary node. Returns the new token total.
+        """
+        tail = self._history_tail
+        middle_end = len(tail) - KEEP_LAST_HISTORY_ITEMS
+        if middle_end <= 0:
+            return total_tokens
+
+        # --- Level 1: per-item summaries ---
+        for i in range(middle_end):
+            entry = tail[i]
+            if entry['_tok'] <= NODE_COMPRESS_TOKEN_THRESHOLD or entry.get('_compressed'):
+                continue
+            kinds = {_part_kind(p) for p in entry['parts']}
+            if kinds not in ({"text"}, {"function_response"}):
+                continue # Keep function_call args intact so call/response pairs stay valid
+            kind = kinds.pop()
+            # A turn may hold several function responses; compress the big ones, one response per call
+            part_threshold = NODE_COMPRESS_TOKEN_THRESHOLD // len(entry['parts'])
+            new_parts = []
+            for part in entry['parts']:
+                if len(entry['parts']) > 1 and _estimate_part_tokens(part) <= part_threshold:
+                    new_parts.append(part)
+                    continue
+                summary = "[compressed] " + self._summarize_for_history(_part_text(part), NODE_SUMMARY_PROMPT)
+                if kind == "text":
+                    new_parts.append(summary)
+                else:
+                    new_parts.append(_function_response_part(part.function_response.name, summary))
+            new_entry = _make_history_entry(entry['role'], *new_parts)
+            new_entry['_compressed'] = True
+            total_tokens += new_entry['_tok'] - entry['_tok']
+            tail[i] = new_entry
+            self._history_view = None
+            log.info(f"Compressed history item {i} ({entry['_tok']} -> {new_entry['_tok']} tokens).")
+            if total_tokens <= budget:
+                return total_tokens
+
+        # --- Level 2: collapse the middle span into one node ---
+        # Don't split a call entry from its response entry at the end of the span
+        if _entry_has(tail[middle_end - 1], "function_call"):
+            middle_end -= 1
+        span = list(itertools.islice(tail, middle_end))
+        if len(span) < 2:
+            return total_tokens
+        span_text = "\n\n".join(
+            f"[{h['role']}] {_entry_text(h)[:MAX_COMPACTION_INPUT_CHARS_PER_ITEM]}" for h in span
+        )
+        summary_part = "<compressed_history_summary>\n" + self._summarize_for_history(span_text, HISTORY_SUMMARY_PROMPT)
+        summary_entry = {'role': 'user', 'parts': [summary_part], '_tok': _estimate_part_tokens(summary_part), '_compressed': True}
+        total_tokens += summary_entry['_tok'] - sum(h['_tok'] for h in span)
+        for _ in span:
+            tail.popleft()
+        tail.appendleft(summary_entry)
+        self._history_view = None
+        log.info(f"Collapsed {len(span)} history items into one summary (~{total_tokens} tokens total).")
+        return total_tokens
+
+    def _summarize_for_history(self, text: str, instruction: str) -> str:
+        """Summarizes text with the cheaper COMPACTION_MODEL, caching results by content hash."""
+        key = hashlib.sha1(f"{instruction}\n{text}".encode('utf-8', 'replace')).hexdigest()
+        cached = self._summary_cache.get(key)
+        if cached is not None:
+            return cached
+        if self._compaction_model is None:
+            self._compaction_model = genai.GenerativeModel(
+                model_name=COMPACTION_MODEL,
+                generation_config=genai.types.GenerationConfig(temperature=0.2),
+                safety_settings=self.safety_settings,
+            )
+        response = self._compaction_model.generate_content(f"{instruction}\n\n{text}")
+        summary = self._extract_text_from_response(response)
+        if not summary:
+            raise ValueError("Compaction model returned no summary text.")
+        self._summary_cache[key] = summary
+        return summary
 
     # --- Text Extraction Helper (if needed for final output) ---
     def _extract_text_from_response(self, response) -> str | None:
          """Safely extracts text from a Gemini response object."""
+         # The SDK's own accessor covers the common text-only response; raises for blocked/empty/non-text ones
+         try:
+             return (response.text or "").strip() or None
+         except (ValueError, AttributeError):
+             pass
          try:
              if response and response.candidates:
                  # Handle potential multi-part responses if ever needed, for now assume text is in the first part
@@ -545,12 +1081,44 @@ The user's first message will contain initial directory context and their reques
     # --- Find Last Text Helper ---
     def _find_last_model_text(self, history: list) -> str:
         """Finds the last text part sent by the model in the history."""
+        entry = self._last_model_entry
+        if entry is not None:
+            return _entry_model_text(entry)
         for i in range(len(history) - 1, -1, -1):
             if history[i]['role'] == 'model':
                 try:
-                     # Check if parts exists and has content
-                     if history[i]['parts'] and hasattr(history[i]['parts'][0], 'text'):
-                           return history[i]['parts'][0].text.strip()
-                except (AttributeError, IndexError):
+                     # A model entry may hold only function calls; keep looking for one with text
+                     text = _entry_model_text(history[i])
+                     if text:
+                           return text
+                except (AttributeError, KeyError):
                      continue # Ignore malformed history entries
-        return "(No previous text response found)"
\ No newline at end of file
+        return "(No previous text response found)"
+
+
+# --- Slash commands handled inside generate() (main.py handles /exit and /help before this) ---
+# Handlers take the GeminiModel and return the text to show, or None.
+async def _exit_cmd(model: GeminiModel) -> None:
+    return None
+
+async def _help_cmd(model: GeminiModel) -> None:
+    return None
+
+async def _compact_cmd(model: GeminiModel) -> str:
+    """Compacts history now, regardless of the token budget."""
+    before = model._history_tokens
+    try:
+        # Budget 0: summarize everything outside the protected head/tail
+        after = await asyncio.to_thread(model._compact_history, before, 0)
+    except Exception as compact_error:
+        log.warning(f"/compact failed: {compact_error}", exc_info=True)
+        model._history_tokens = sum(h['_tok'] for h in model.chat_history) # Some items may already be compressed
+        return f"Error compacting history: {compact_error}"
+    model._history_tokens = after
+    return f"History compacted: ~{before} -> ~{after} tokens ({len(model.chat_history)} items)."
+
+_COMMAND_HANDLERS = {
+    '/exit': _exit_cmd,
+    '/help': _help_cmd,
+    '/compact': _compact_cmd,
+}
@@ -1,75 +1,109 @@
 """
 Tools module initialization. Registers all available tools.
-Includes Summarizer Tool.
+Tool modules are imported lazily, on first lookup. Includes Summarizer Tool.
 """
 
 import logging
+import importlib
+from collections.abc import Mapping
 from .base import BaseTool
-from .file_tools import ViewTool, EditTool, GrepTool, GlobTool
-from .directory_tools import LsTool
 
-# --- Tool Imports ---
-try: from .system_tools import BashTool; bash_tool_available = True
-except ImportError: logging.warning("system_tools.BashTool not found. Disabled."); bash_tool_available = False
+# --- Tool Registry ---
+# name -> (module, class). Modules are imported on first lookup, not when this package loads,
+# so commands that never touch a tool don't pay for importing all of them.
+# Order matters: it is the order tools appear in the system prompt.
+_TOOL_LOADERS = {
+    "view": ("file_tools", "ViewTool"),
+    "edit": ("file_tools", "EditTool"),
+    "ls": ("directory_tools", "LsTool"),
+    "grep": ("file_tools", "GrepTool"),
+    "glob": ("file_tools", "GlobTool"),
+    "create_directory": ("directory_tools", "CreateDirectoryTool"),
+    "task_complete": ("task_complete_tool", "TaskCompleteTool"),
+    "tree": ("tree_tool", "TreeTool"),
+    "bash": ("system_tools", "BashTool"),
+    "linter_checker": ("quality_tools", "LinterCheckerTool"),
+    "formatter": ("quality_tools", "FormatterTool"),
+    "test_runner": ("test_runner", "TestRunnerTool"),
+}
+# Summarizer tool is not added by default; it is still importable as an attribute (see __getattr__)
+_EXTRA_CLASSES = {"SummarizeCodeTool": ("summarizer_tool", "SummarizeCodeTool")}
+
+def _import_class(module_name: str, class_name: str) -> type[BaseTool]:
+    return getattr(importlib.import_module(f".{module_name}", __name__), class_name)
 
-try: from .task_complete_tool import TaskCompleteTool; task_complete_available = True
-except ImportError: logging.warning("task_complete_tool.TaskCompleteTool not found. Disabled."); task_complete_available = False
+class _LazyToolRegistry(Mapping):
+    """Read-only mapping of tool names to tool classes that imports each class on first access.
+    A tool whose import fails is logged once and dropped, as if it had never been registered."""
 
-try: from .directory_tools import CreateDirectoryTool; create_dir_available = True
-except ImportError: logging.warning("directory_tools.CreateDirectoryTool not found. Disabled."); create_dir_available = False
+    def __init__(self, loaders: dict):
+        self._loaders = dict(loaders)
+        self._classes = {}
 
-try: from .quality_tools import LinterCheckerTool, FormatterTool; quality_tools_available = True
-except ImportError: logging.warning("quality_tools not found or missing classes. Disabled."); quality_tools_available = False
+    def __getitem__(self, name: str) -> type[BaseTool]:
+        try:
+            return self._classes[name]
+        except KeyError:
+            pass
+        module_name, class_name = self._loaders[name] # KeyError for unknown names
+        try:
+            tool_class = _import_class(module_name, class_name)
+        except (ImportError, AttributeError) as e:
+            logging.warning(f"{module_name}.{class_name} not found ({e}). Tool '{name}' disabled.")
+            del self._loaders[name]
+            raise KeyError(name) from e
+        self._classes[name] = tool_class
+        return tool_class
 
-# Import the new summarizer tool
-try: from .summarizer_tool import SummarizeCodeTool; summarizer_available = True
-except ImportError: logging.warning("summarizer_tool.SummarizeCodeTool not found. Disabled."); summarizer_available = False
+    def __iter__(self):
+        return iter(list(self._loaders))
 
-# Assuming test_runner exists from previous steps
-test_runner_available = True
-if test_runner_available:
-    try: from .test_runner import TestRunnerTool
-    except ImportError: logging.warning("test_runner.py exists but failed import?"); test_runner_available=False
-# --- End Tool Imports ---
+    def __len__(self):
+        return len(self._loaders)
 
-from .tree_tool import TreeTool
+    def items(self):
+        """(name, class) pairs for every tool that imports; resolves them all."""
+        return list(iter_tool_classes())
 
 # AVAILABLE_TOOLS maps tool names (strings) to the actual tool classes.
-# Start with core, guaranteed tools
-AVAILABLE_TOOLS = {
-    "view": ViewTool,
-    "edit": EditTool,
-    "ls": LsTool,
-    "grep": GrepTool,
-    "glob": GlobTool,
-    "create_directory": CreateDirectoryTool,
-    "task_complete": TaskCompleteTool,
-    "tree": TreeTool,
-}
+AVAILABLE_TOOLS = _LazyToolRegistry(_TOOL_LOADERS)
+
+def iter_tool_classes():
+    """Yields (name, class) for every available tool, importing any not loaded yet."""
+    for name in list(AVAILABLE_TOOLS):
+        try:
+            yield name, AVAILABLE_TOOLS[name]
+        except KeyError:
+            continue # Import failed; already logged and removed
+
+def __getattr__(name: str):
+    """Lazy access to tool classes as package attributes, e.g. `from .tools import ViewTool`."""
+    for module_name, class_name in (*_TOOL_LOADERS.values(), *_EXTRA_CLASSES.values()):
+        if class_name == name:
+            return _import_class(module_name, class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+# --- End Tool Registry ---
 
-# Conditionally add tools based on successful imports
-if bash_tool_available: AVAILABLE_TOOLS["bash"] = BashTool
-# task_complete is core, already added
-# create_directory is core, already added
-if quality_tools_available:
-    AVAILABLE_TOOLS["linter_checker"] = LinterCheckerTool
-    AVAILABLE_TOOLS["formatter"] = FormatterTool
-# Summarizer tool is not added by default
-if test_runner_available: AVAILABLE_TOOLS["test_runner"] = TestRunnerTool
-# tree is core, already added
+# Tools keep no per-call state, so one shared instance per name is enough
+_INSTANCES: dict[str, BaseTool] = {}
 
 def get_tool(name: str) -> BaseTool | None:
     """
     Retrieves an *instance* of the tool class based on its name.
+    Instances are created on first request and shared afterwards.
     NOTE: Does NOT handle special constructors (like SummarizeCodeTool needing the model).
           That specific instantiation happens in the GeminiModel class now.
     """
+    instance = _INSTANCES.get(name)
+    if instance is not None:
+        return instance
     tool_class = AVAILABLE_TOOLS.get(name)
     if tool_class:
         try:
              # For most tools, simple instantiation works
              if name != "summarize_code": # Exclude the special case
-                  return tool_class()
+                  instance = _INSTANCES[name] = tool_class()
+                  return instance
              else:
                   # Raise error or return None if called for summarize_code,
                   # as it needs special handling elsewhere.
@@ -82,4 +116,4 @@ def get_tool(name: str) -> BaseTool | None:
         logging.warning(f"Tool '{name}' not found in AVAILABLE_TOOLS.")
         return None
 
-logging.info(f"Tools initialized. Available: {list(AVAILABLE_TOOLS.keys())}")
\ No newline at end of file
+logging.info(f"Tools registered (imported on first use): {list(AVAILABLE_TOOLS.keys())}")
\ No newline at end of file
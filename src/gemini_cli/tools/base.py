@@ -2,27 +2,141 @@
 Base tool implementation and interfaces.
 """
 
+import os
 import shlex
+import signal
+import asyncio
 import inspect
+import functools
+from typing import ClassVar
 from abc import ABC, abstractmethod
 from google.generativeai.types import FunctionDeclaration
 import logging
 
 log = logging.getLogger(__name__)
 
+# Python annotation -> JSON schema type for tool parameters; anything else is sent as "string"
+_TYPE_MAP = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array", # Note: items type not specified here
+    dict: "object", # Note: properties not specified here
+}
+
+@functools.cache
+def _workspace_root() -> str:
+    """The directory the CLI was started in, with symlinks resolved. Tools are confined to it."""
+    return os.path.realpath(os.getcwd())
+
+def is_within_workspace(path: str) -> bool:
+    """True if path, relative to the cwd and with symlinks resolved, is the workspace root or below it.
+    Unlike checking for '..' components, this catches 'a/../../x', absolute paths and symlink escapes."""
+    root = _workspace_root()
+    try:
+        return os.path.commonpath([os.path.realpath(path), root]) == root
+    except ValueError: # e.g. a different drive on Windows
+        return False
+
+async def _read_bounded(stream: asyncio.StreamReader, limit: int, tail: bool) -> bytes:
+    """Drains stream to EOF, keeping only its last (tail=True) or first `limit` bytes."""
+    buf = bytearray()
+    while chunk := await stream.read(64 * 1024):
+        if tail:
+            buf += chunk
+            if len(buf) > limit:
+                del buf[:-limit]
+        elif len(buf) < limit: # Keep reading past the limit so the child never blocks on a full pipe
+            buf += chunk[:limit - len(buf)]
+    return bytes(buf)
+
+KILL_DRAIN_TIMEOUT_SECONDS = 2.0 # After a kill, how long to wait for the pipes to close before giving up on them
+
+def _kill_process_tree(process: asyncio.subprocess.Process):
+    """SIGKILLs the child's whole process group (it leads its own session), so shell grandchildren die too."""
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError: # Everything in the group already exited
+            pass
+    elif process.returncode is None: # Windows: no process groups; kill the child itself
+        process.kill()
+
+async def run_command_async(command, timeout: float, shell: bool = False,
+                            output_limit: int | None = None, keep_tail: bool = True) -> tuple[int, str, str]:
+    """Runs a command (an argv list, or a string with shell=True) without blocking the event loop.
+    Returns (exit code, stdout, stderr). Raises FileNotFoundError if the executable is missing and
+    asyncio.TimeoutError (after killing the process and everything it started) if it runs longer than `timeout` seconds.
+    With output_limit, stdout and stderr are read as they arrive and only their last (or, with
+    keep_tail=False, first) output_limit bytes are held, so a chatty command can't grow memory unbounded."""
+    # A new session makes the child a process group leader, so a timeout can kill its descendants as well
+    pipes = dict(stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    if shell:
+        process = await asyncio.create_subprocess_shell(command, **pipes)
+    else:
+        process = await asyncio.create_subprocess_exec(*command, **pipes)
+    try:
+        if output_limit is None:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        else:
+            stdout, stderr, _ = await asyncio.wait_for(asyncio.gather(
+                _read_bounded(process.stdout, output_limit, keep_tail),
+                _read_bounded(process.stderr, output_limit, keep_tail),
+                process.wait(),
+            ), timeout=timeout)
+    except BaseException: # Timeout or cancellation: don't leave the child (or anything it started) running
+        # Even if the child itself exited, a background grandchild may still hold the pipes open
+        _kill_process_tree(process)
+        # Drain the pipes to EOF too: wait() doesn't return while unread output holds them open.
+        # Bounded, in case a descriptor leaked to a process outside the group.
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                _read_bounded(process.stdout, 0, False), _read_bounded(process.stderr, 0, False), process.wait(),
+            ), timeout=KILL_DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            log.warning(f"Pipes of killed process {process.pid} still open after {KILL_DRAIN_TIMEOUT_SECONDS}s; abandoning them.")
+        raise
+    return process.returncode, stdout.decode('utf-8', 'replace'), stderr.decode('utf-8', 'replace')
+
+def run_sync(coroutine):
+    """Runs an execute_async() coroutine to completion for a synchronous execute() caller."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Called from inside an event loop (e.g. a sync callback): asyncio.run() would refuse, so use a fresh thread
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
 class BaseTool(ABC):
     """Base class for all tools."""
     
     name = None
     description = "Base tool"
+    # False if execute() must not run concurrently with other tool calls (e.g. it relies on process-wide state)
+    thread_safe: ClassVar[bool] = True
     
     @abstractmethod
     def execute(self, *args, **kwargs):
         """Execute the tool with the given arguments."""
         pass
+
+    async def execute_async(self, **kwargs):
+        """Awaitable execute(). Subprocess tools override this natively; the rest run execute() in a thread."""
+        return await asyncio.to_thread(self.execute, **kwargs)
     
     @classmethod
     def get_function_declaration(cls) -> FunctionDeclaration | None:
+        """FunctionDeclaration for this tool, built on first use and stored on the class."""
+        # Look in cls.__dict__ so a subclass never picks up its parent's cached declaration
+        if '_function_declaration' not in cls.__dict__:
+            cls._function_declaration = cls._build_function_declaration()
+        return cls._function_declaration
+
+    @classmethod
+    def _build_function_declaration(cls) -> FunctionDeclaration | None:
         """Generates FunctionDeclaration based on the execute method's signature."""
         if not cls.name or not cls.description:
             log.warning(f"Tool {cls.__name__} is missing name or description. Cannot generate declaration.")
@@ -38,15 +152,11 @@ class BaseTool(ABC):
                 if param_name == 'self':
                     continue 
                 
-                # Basic type mapping (can be enhanced)
-                param_type = "string" # Default to string
-                if param.annotation == str: param_type = "string"
-                elif param.annotation == int: param_type = "integer"
-                elif param.annotation == float: param_type = "number"
-                elif param.annotation == bool: param_type = "boolean"
-                elif param.annotation == list: param_type = "array" # Note: items type not specified here
-                elif param.annotation == dict: param_type = "object" # Note: properties not specified here
-                # Add more complex type handling if needed (e.g., from typing import List, Dict)
+                # Basic type mapping (can be enhanced, e.g. for typing.List/Dict)
+                try:
+                    param_type = _TYPE_MAP.get(param.annotation, "string")
+                except TypeError: # Unhashable annotation
+                    param_type = "string"
 
                 # Assume description from docstring or default
                 # (More advanced: parse docstring for arg descriptions)
@@ -65,15 +175,10 @@ class BaseTool(ABC):
             if not parameters:
                 schema = None
             else:
-                schema = {
-                    "type": "object",
-                    "properties": parameters,
-                     # Ensure required list is not empty if there are required params
-                    "required": required if required else None 
-                }
-                # Clean up schema if required is None/empty
-                if schema["required"] is None:
-                    del schema["required"]
+                schema = {"type": "object", "properties": parameters}
+                # Only include 'required' when there is at least one required param
+                if required:
+                    schema["required"] = required
 
             return FunctionDeclaration(
                 name=cls.name,
@@ -2,12 +2,60 @@
 Tools for directory operations.
 """
 import os
+import stat
+import time
+import heapq
 import logging
-import subprocess
-from .base import BaseTool
+import functools
+from .base import BaseTool, is_within_workspace
+
+try:
+    import pwd, grp
+except ImportError: # Not available on Windows; owners are shown as numeric ids
+    pwd = grp = None
 
 log = logging.getLogger(__name__)
 
+LS_MAX_LINES = 100 # Including the 'total' line
+_SIX_MONTHS_SECONDS = 182 * 24 * 3600 # ls shows the year instead of the time for older (or future) mtimes
+
+@functools.lru_cache(maxsize=64)
+def _owner_name(uid: int) -> str:
+    try: return pwd.getpwuid(uid).pw_name
+    except (AttributeError, KeyError): return str(uid)
+
+@functools.lru_cache(maxsize=64)
+def _group_name(gid: int) -> str:
+    try: return grp.getgrgid(gid).gr_name
+    except (AttributeError, KeyError): return str(gid)
+
+def _format_ls_time(mtime: float, now: float) -> str:
+    t = time.localtime(mtime)
+    month = time.strftime('%b', t)
+    if now - _SIX_MONTHS_SECONDS < mtime <= now:
+        return f"{month} {t.tm_mday:>2} {t.tm_hour:02d}:{t.tm_min:02d}"
+    return f"{month} {t.tm_mday:>2} {t.tm_year:>5}"
+
+def _format_ls_rows(rows, with_total: bool) -> str:
+    """`ls -lA`-style text for (name, lstat result, path) rows, with ls's column alignment."""
+    now = time.time()
+    table = []
+    for name, st, path in rows:
+        if stat.S_ISLNK(st.st_mode):
+            try: name = f"{name} -> {os.readlink(path)}"
+            except OSError: pass
+        table.append((stat.filemode(st.st_mode), str(st.st_nlink), _owner_name(st.st_uid), _group_name(st.st_gid),
+                      str(st.st_size), _format_ls_time(st.st_mtime, now), name))
+    lines = []
+    if with_total:
+        # st_blocks is in 512-byte units; ls reports 1K blocks, rounded up
+        lines.append(f"total {(sum(getattr(st, 'st_blocks', 0) for _, st, _ in rows) + 1) // 2}")
+    if table:
+        w_links, w_user, w_group, w_size = (max(len(row[i]) for row in table) for i in (1, 2, 3, 4))
+        lines.extend(f"{mode} {links:>{w_links}} {user:<{w_user}} {group:<{w_group}} {size:>{w_size}} {mtime} {name}"
+                     for mode, links, user, group, size, mtime, name in table)
+    return "\n".join(lines)
+
 class CreateDirectoryTool(BaseTool):
     """Tool to create a new directory."""
     name = "create_directory"
@@ -26,7 +74,7 @@ class CreateDirectoryTool(BaseTool):
         try:
             # Resolve the path to an absolute path to prevent directory traversal
             target_path = os.path.abspath(os.path.join(os.getcwd(), dir_path))
-            if not target_path.startswith(os.getcwd()):
+            if not is_within_workspace(target_path):
                 log.warning(f"Attempted directory traversal in create_directory path: '{dir_path}' resolved to '{target_path}'")
                 return f"Error: Invalid path '{dir_path}'. Path is outside the current workspace."
             log.info(f"Attempting to create directory: {target_path}")
@@ -51,7 +99,7 @@ class CreateDirectoryTool(BaseTool):
             return f"Error creating directory: {str(e)}"
 
 class LsTool(BaseTool):
-    """Tool to list directory contents using 'ls -lA'."""
+    """Tool to list directory contents in 'ls -lA' format."""
     name = "ls"
     description = "Lists the contents of a specified directory (long format, including hidden files)."
     args_schema: dict = {
@@ -63,57 +111,42 @@ class LsTool(BaseTool):
     required_args: list[str] = []
 
     def execute(self, path: str | None = None) -> str:
-        """Executes the 'ls -lA' command."""
+        """Lists the directory like 'ls -lA', read with os.scandir instead of running ls."""
         target_path = "."  # Default to current directory
         if path:
             # Resolve the path to an absolute path to prevent directory traversal
             abs_path = os.path.abspath(os.path.join(os.getcwd(), path))
-            if not abs_path.startswith(os.getcwd()):
+            if not is_within_workspace(abs_path):
                 log.warning(f"Attempted directory traversal in ls path: '{path}' resolved to '{abs_path}'")
                 return f"Error: Invalid path '{path}'. Path is outside the current workspace."
             target_path = path
 
-        command = ['ls', '-lA', target_path]
-        log.info(f"Executing ls command: {' '.join(command)}")
-
+        log.info(f"Listing directory: {target_path}")
         try:
-            process = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                check=False,  # Don't raise exception on non-zero exit code
-                timeout=15    # Add a timeout
-            )
-
-            if process.returncode == 0:
-                log.info(f"ls command successful for path '{target_path}'.")
-                # Limit output size? ls -l can be long.
-                output = process.stdout.strip()
-                # Example truncation (adjust as needed)
-                if len(output.splitlines()) > 100:
-                     log.warning(f"ls output for '{target_path}' exceeded 100 lines. Truncating.")
-                     output = "\n".join(output.splitlines()[:100]) + "\n... (output truncated)"
-                return output
-            else:
-                # Handle cases like directory not found specifically if possible
-                stderr_lower = process.stderr.lower()
-                if "no such file or directory" in stderr_lower:
-                     log.error(f"ls command failed: Directory not found '{target_path}'. Stderr: {process.stderr.strip()}")
-                     return f"Error: Directory not found: '{target_path}'"
-                else:
-                     log.error(f"ls command failed with return code {process.returncode}. Path: '{target_path}'. Stderr: {process.stderr.strip()}")
-                     error_detail = process.stderr.strip() if process.stderr else "(No stderr)"
-                     return f"Error executing ls command (Code: {process.returncode}): {error_detail}"
-
+            if not os.path.isdir(target_path):
+                # Like ls: a file argument lists just that file
+                st = os.lstat(target_path)
+                return _format_ls_rows([(target_path, st, target_path)], with_total=False)
+            with os.scandir(target_path) as it:
+                entries = list(it) # Names only; nothing is stat'ed yet
+            # Limit output size: ls -l can be long. Only the entries that are shown get lstat'ed
+            # and formatted; the rest are just counted
+            shown = heapq.nsmallest(LS_MAX_LINES - 1, entries, key=lambda e: e.name) # One line is 'total'
+            rows = [(e.name, e.stat(follow_symlinks=False), e.path) for e in shown]
+            output = _format_ls_rows(rows, with_total=True)
+            log.info(f"ls successful for path '{target_path}'.")
+            if len(entries) > len(shown):
+                log.warning(f"ls output for '{target_path}' exceeded {LS_MAX_LINES} lines. Truncating.")
+                output += f"\n... ({len(entries) - len(shown)} more entries not shown)"
+            return output
         except FileNotFoundError:
-             # This means 'ls' itself wasn't found - unlikely but possible
-             log.error("'ls' command not found (FileNotFoundError). It might not be installed or in PATH.")
-             return "Error: 'ls' command not found. Please ensure it is installed and in the system's PATH."
-        except subprocess.TimeoutExpired:
-             log.error(f"ls command timed out for path '{target_path}' after 15 seconds.")
-             return f"Error: ls command timed out for path '{target_path}'."
+            log.error(f"ls failed: Directory not found '{target_path}'.")
+            return f"Error: Directory not found: '{target_path}'"
+        except OSError as e:
+            log.error(f"ls failed for path '{target_path}': {e}")
+            return f"Error listing directory '{target_path}': {e.strerror or e}"
         except Exception as e:
-            log.exception(f"An unexpected error occurred while executing ls command for path '{target_path}': {e}")
+            log.exception(f"An unexpected error occurred while listing '{target_path}': {e}")
             return f"An unexpected error occurred while executing ls: {str(e)}"
 
     # Assuming BaseTool provides a working get_function_declaration implementation
\ No newline at end of file
@@ -2,13 +2,23 @@
 File operation tools.
 """
 # --- ADDED IMPORT ---
-from .base import BaseTool
+from .base import BaseTool, is_within_workspace
 # --- END IMPORT ---
 
 import os
 import glob
+import mmap
+import functools
 import re
+import stat
+import time
+import secrets
 import logging
+import itertools
+import fnmatch
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 # Note: MAX_CHARS_FOR_FULL_CONTENT is now defined in summarizer_tool.py,
 # so we import it or redefine it here if ViewTool uses it independently.
@@ -23,6 +33,246 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+GREP_BINARY_PROBE_BYTES = 8192 # A NUL byte in this much of a file's head marks it as binary
+IO_BUFFER_SIZE = 1 << 20 # For file reads/writes that may be large
+GREP_MMAP_MIN_BYTES = 256 * 1024 # Bigger files are searched in place by the regex engine (bytes patterns only)
+GREP_MAX_WORKERS = min(32, (os.cpu_count() or 4) * 4) # File reads release the GIL; overlap them
+GREP_WINDOW = GREP_MAX_WORKERS * 4 # Files submitted ahead of the one being consumed
+
+# glob.glob results, reused while the root directory's mtime is unchanged and for at most the TTL
+# (nested changes don't touch the root's mtime). Callers that modify files should clear_glob_cache().
+GLOB_CACHE_TTL_SECONDS = 5.0
+GLOB_CACHE_MAX_ENTRIES = 32
+_GLOB_CACHE: OrderedDict[tuple[str, bool], tuple[int, float, list[str]]] = OrderedDict()
+_GLOB_CACHE_LOCK = threading.Lock() # Tools may run concurrently in worker threads
+GLOB_WALK_WORKERS = 8 # Directories listed concurrently by the `**/name` walker
+
+def _scan_visible(path: str, ancestors: frozenset) -> tuple[list[str], list[tuple[str, frozenset]]]:
+    """(non-hidden entry paths, (subdirectory, its ancestors) to descend into) for one directory.
+
+    Like glob's `**`, symlinked directories are followed; `ancestors` holds the (st_dev, st_ino) of the
+    directories above, so a link back into one of them is listed but not entered again.
+    """
+    entries, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith('.'): continue
+                entries.append(entry.path)
+                try:
+                    if not entry.is_dir(): continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                dir_id = (st.st_dev, st.st_ino)
+                if dir_id not in ancestors: subdirs.append((entry.path, ancestors | {dir_id}))
+    except OSError:
+        pass
+    return entries, subdirs
+
+def _walk_visible_parallel(root: str) -> list[str]:
+    """Every non-hidden path below root, through non-hidden directories, listing directories concurrently.
+
+    Work is fed from this thread as listings complete, so workers never block waiting on each other.
+    Paths come back in glob's order regardless: each directory's entries, directories depth-first.
+    """
+    listings = {} # directory -> (entries, subdirectories), filled in as concurrent listings complete
+    st = os.stat(root)
+    with ThreadPoolExecutor(max_workers=GLOB_WALK_WORKERS) as executor:
+        pending = {executor.submit(_scan_visible, root, frozenset({(st.st_dev, st.st_ino)})): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entries, subdirs = future.result()
+                listings[pending.pop(future)] = (entries, [subdir for subdir, _ in subdirs])
+                for subdir, ancestors in subdirs:
+                    pending[executor.submit(_scan_visible, subdir, ancestors)] = subdir
+    # Same directory can be reached twice via symlinks; each visit has its own path, so keys are unique
+    paths = []
+    stack = [root]
+    while stack:
+        entries, subdirs = listings[stack.pop()]
+        paths.extend(entries)
+        stack.extend(reversed(subdirs))
+    return paths
+
+def _glob(pattern: str, root: str, recursive: bool) -> list[str]:
+    """glob.glob(pattern, recursive=recursive), with a parallel walk for the common `root/**/name` form.
+
+    Same results, in the same order, as glob for that form, except that a symlink cycle is entered
+    once instead of until the OS refuses the path.
+    """
+    prefix = root.rstrip(os.sep) + os.sep
+    rel_pattern = pattern[len(prefix):] if pattern.startswith(prefix) else None
+    if recursive and rel_pattern and rel_pattern.startswith('**' + os.sep):
+        name_pattern = rel_pattern[3:]
+        # Only a single wildcard name component; a leading '.' would make glob include hidden names
+        if name_pattern and os.sep not in name_pattern and '**' not in name_pattern and not name_pattern.startswith('.'):
+            match = re.compile(fnmatch.translate(os.path.normcase(name_pattern))).match
+            return [p for p in _walk_visible_parallel(root) if match(os.path.normcase(os.path.basename(p)))]
+    return glob.glob(pattern, recursive=recursive)
+
+def _cached_glob(pattern: str, root: str, recursive: bool = True) -> list[str]:
+    """glob.glob(pattern), cached per (pattern, recursive) and validated against root's mtime."""
+    root_mtime = os.stat(root).st_mtime_ns
+    key = (pattern, recursive)
+    now = time.monotonic()
+    with _GLOB_CACHE_LOCK:
+        cached = _GLOB_CACHE.get(key)
+        if cached and cached[0] == root_mtime and now - cached[1] < GLOB_CACHE_TTL_SECONDS:
+            _GLOB_CACHE.move_to_end(key)
+            return list(cached[2])
+    matches = _glob(pattern, root, recursive)
+    with _GLOB_CACHE_LOCK:
+        _GLOB_CACHE[key] = (root_mtime, now, matches)
+        _GLOB_CACHE.move_to_end(key)
+        while len(_GLOB_CACHE) > GLOB_CACHE_MAX_ENTRIES:
+            _GLOB_CACHE.popitem(last=False)
+    return list(matches)
+
+def clear_glob_cache():
+    """Drops all cached glob results, e.g. after a tool may have created or removed files."""
+    with _GLOB_CACHE_LOCK:
+        _GLOB_CACHE.clear()
+
+def _write_text_atomic(path: str, *chunks: str):
+    """Writes the concatenated chunks to path via a sibling temp file and os.replace, so readers never see a partial file.
+    Keeps an existing file's permissions, and writes through symlinks rather than replacing them."""
+    path = os.path.realpath(path)
+    directory, basename = os.path.split(path)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = None
+    # Created like open() creates files (0666 less the umask, applied by the kernel), unlike mkstemp's 0600
+    while True:
+        tmp_path = os.path.join(directory, f".{basename}.{secrets.token_hex(4)}.tmp")
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+            for chunk in chunks:
+                f.write(chunk)
+            # On disk before the rename, so a crash leaves either the old file or the complete new one
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None: # Keep the existing file's permissions
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try: os.unlink(tmp_path)
+        except OSError: pass
+        raise
+
+def _relative_path(path: str, root: str, prefix: str) -> str:
+    """os.path.relpath(path, root), by slicing off `prefix` (root + os.sep) when path is plainly under it."""
+    if path.startswith(prefix):
+        rel = path[len(prefix):]
+        # Only for already-normalized paths: no '.'/'..' or empty components, which relpath would collapse
+        if rel and rel[0] != '.' and (os.sep + '.') not in rel and (os.sep * 2) not in rel and not rel.endswith(os.sep):
+            return rel
+    return os.path.relpath(path, root)
+
+def _iter_files(root: str):
+    """Yields file paths under root, like os.walk order (a directory's files, then its subdirectories).
+    DirEntry type info saves a stat per entry; hidden and __pycache__ directories are pruned, not entered."""
+    subdirs = []
+    try:
+        with os.scandir(root) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    name = entry.name
+                    if not (name.startswith('.') or name == '__pycache__'): subdirs.append(entry.path)
+                elif entry.is_file(): # Follows symlinks, as os.path.isfile did
+                    yield entry.path
+    except OSError as e:
+        log.debug(f"Skipping unreadable directory {root}: {e}")
+    for subdir in subdirs:
+        yield from _iter_files(subdir)
+
+# Tokens whose meaning differs between a str and a bytes pattern: '.' and '[^...]' match one byte rather than
+# one character, \w \b \d \s are ASCII-only on bytes, \x/\u/octal escapes name code points, (?i) folds case
+# and (?u) is rejected outright by the bytes compiler
+_GREP_TOKEN_RE = re.compile(r'\\.|\[\^|\(\?[a-zA-Z-]*|.', re.DOTALL)
+_BYTES_UNSAFE_ESCAPES = frozenset('wWbBdDsSxuUN0123456789')
+_BYTES_UNSAFE_FLAGS = frozenset('iu')
+
+def _bytes_safe(pattern: str) -> bool:
+    """True if pattern matches raw UTF-8 bytes exactly as it matches decoded text (e.g. literal patterns)."""
+    if not pattern.isascii():
+        return False
+    for token in _GREP_TOKEN_RE.findall(pattern):
+        if token in ('.', '[^') or (token.startswith('(?') and not _BYTES_UNSAFE_FLAGS.isdisjoint(token)):
+            return False
+        if len(token) == 2 and token[0] == '\\' and token[1] in _BYTES_UNSAFE_ESCAPES:
+            return False
+    return True
+
+@functools.lru_cache(maxsize=256)
+def _grep_regex(pattern: str) -> re.Pattern:
+    """Compiled grep pattern, kept across calls (repeat searches are common). Raises re.error if invalid."""
+    regex = re.compile(pattern) # Validates with str semantics, so errors read the same either way
+    # Byte-safe patterns run on raw lines, which skips decoding non-matching ones; the rest match decoded text
+    return re.compile(pattern.encode()) if _bytes_safe(pattern) else regex
+
+@functools.lru_cache(maxsize=32)
+def _multiline_regex(regex: re.Pattern) -> re.Pattern | None:
+    """regex with ^ matching at line starts, for searching a whole file at once. None if the pattern
+    uses '$': in multiline mode it only matches before '\n', so it would miss CRLF line ends."""
+    if '$' in _GREP_TOKEN_RE.findall(regex.pattern.decode()):
+        return None
+    return re.compile(regex.pattern, regex.flags | re.MULTILINE)
+
+def _grep_mapped(data, regex: re.Pattern, scan: re.Pattern, max_matches: int) -> list[tuple[int, bytes]]:
+    """_grep_file for a whole file in memory (an mmap). `scan` (see _multiline_regex) finds the next
+    candidate in C; only the line holding it is sliced out and re-checked with `regex`."""
+    matches = []
+    size = len(data)
+    pos = 0
+    line_no, counted_to = 1, 0 # Newlines are counted incrementally, up to the current line's start
+    while pos < size and len(matches) < max_matches:
+        m = scan.search(data, pos)
+        if not m: break
+        start = data.rfind(b'\n', 0, m.start()) + 1
+        end = data.find(b'\n', m.start())
+        end = size if end < 0 else end + 1
+        line_no += data[counted_to:start].count(b'\n')
+        counted_to = start
+        line = data[start:end].rstrip(b'\r\n')
+        # A candidate can span lines; line-by-line grep only reports lines that match on their own
+        if regex.search(line):
+            matches.append((line_no, line.rstrip()))
+        pos = end
+    return matches
+
+def _grep_file(file_path: str, regex: re.Pattern, max_matches: int) -> list[tuple[int, bytes]]:
+    """(line number, raw line without trailing whitespace) for up to max_matches lines of file_path
+    matching regex. [] for binary files.
+
+    A bytes regex is matched against the raw lines, so lines are never decoded here.
+    A str regex (any pattern that isn't byte-safe) is matched against each decoded line instead.
+    Either way the line ending (\n, \r\n or \r) is stripped first, so '$' anchors work on CRLF files.
+    """
+    matches = []
+    with open(file_path, 'rb', buffering=IO_BUFFER_SIZE) as f:
+        if b'\0' in f.read(GREP_BINARY_PROBE_BYTES):
+            return matches
+        match_bytes = isinstance(regex.pattern, bytes)
+        scan = _multiline_regex(regex) if match_bytes else None
+        if scan is not None and os.fstat(f.fileno()).st_size > GREP_MMAP_MIN_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _grep_mapped(data, regex, scan, max_matches)
+        f.seek(0)
+        for i, line in enumerate(f, 1):
+            text = line.rstrip(b'\r\n')
+            if not regex.search(text if match_bytes else text.decode('utf-8', 'ignore')): continue
+            matches.append((i, line.rstrip()))
+            if len(matches) >= max_matches: break
+    return matches
+
 class ViewTool(BaseTool):
     """Tool to view specific sections or small files. For large files, use summarize_code."""
     name = "view"
@@ -41,40 +291,41 @@ class ViewTool(BaseTool):
         """
         try:
             # Basic path safety
-            if ".." in file_path.split(os.path.sep):
-                 log.warning(f"Attempted to access parent directory in path: {file_path}")
-                 return f"Error: Invalid file path '{file_path}'. Cannot access parent directories."
-
             path = os.path.abspath(os.path.expanduser(file_path))
+            if not is_within_workspace(path):
+                 log.warning(f"Attempted to access a path outside the workspace: {file_path}")
+                 return f"Error: Invalid file path '{file_path}'. Path is outside the current workspace."
+
             log.info(f"Viewing file: {path} (Offset: {offset}, Limit: {limit})")
 
-            if not os.path.exists(path):
+            # One stat answers exists / is-a-file / size
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
                 log.warning(f"File not found for view: {file_path}")
                 return f"Error: File not found: {file_path}"
-            if not os.path.isfile(path):
+            if not stat.S_ISREG(st.st_mode):
                  log.warning(f"Attempted to view a directory: {file_path}")
                  return f"Error: Cannot view a directory: {file_path}"
 
             # Check size if offset/limit are NOT provided
             if offset is None and limit is None:
-                 file_size = os.path.getsize(path)
+                 file_size = st.st_size
                  if file_size > MAX_CHARS_FOR_FULL_CONTENT:
                       log.warning(f"File '{file_path}' is large ({file_size} bytes) and no offset/limit provided for view.")
                       return f"Error: File '{file_path}' is large. Use the 'summarize_code' tool for an overview, or 'view' with offset/limit for specific sections."
 
-            # Proceed with reading
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-
             start_index = 0
             if offset is not None:
                 start_index = max(0, int(offset) - 1)
 
-            end_index = len(lines)
+            end_index = None # Read to the end of the file
             if limit is not None:
                 end_index = start_index + max(0, int(limit))
 
-            content_slice = lines[start_index:end_index]
+            # Proceed with reading: stream lines and keep only the requested slice, stopping at its end
+            with open(path, 'r', encoding='utf-8', errors='ignore', buffering=IO_BUFFER_SIZE) as f:
+                content_slice = list(itertools.islice(f, start_index, end_index))
 
             result = []
             for i, line in enumerate(content_slice):
@@ -112,29 +363,29 @@ class EditTool(BaseTool):
             A success message or an error message.
         """
         try:
-            if ".." in file_path.split(os.path.sep):
-                 log.warning(f"Attempted access to parent directory: {file_path}")
-                 return f"Error: Invalid file path '{file_path}'."
             path = os.path.abspath(os.path.expanduser(file_path))
+            if not is_within_workspace(path):
+                 log.warning(f"Attempted access outside the workspace: {file_path}")
+                 return f"Error: Invalid file path '{file_path}'."
             log.info(f"Editing file: {path}")
             directory = os.path.dirname(path)
-            if directory and not os.path.exists(directory):
-                 log.info(f"Creating directory: {directory}"); os.makedirs(directory, exist_ok=True)
+            if directory: os.makedirs(directory, exist_ok=True) # No-op if it already exists
 
             if content is not None:
                 if old_string is not None or new_string is not None: log.warning("Prioritizing 'content' over 'old/new_string'.")
                 log.info(f"Writing content (length: {len(content)}) to {path}.")
-                with open(path, 'w', encoding='utf-8') as f: f.write(content)
+                _write_text_atomic(path, content)
                 return f"Successfully wrote content to {file_path}."
             elif old_string is not None and new_string is not None:
                 log.info(f"Replacing '{old_string[:50]}...' with '{new_string[:50]}...' in {path}.")
-                if not os.path.exists(path): return f"Error: File not found for replacement: {file_path}"
                 try:
-                    with open(path, 'r', encoding='utf-8') as f: original_content = f.read()
+                    with open(path, 'r', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f: original_content = f.read()
+                except FileNotFoundError: return f"Error: File not found for replacement: {file_path}"
                 except Exception as read_err: return f"Error reading file for replacement: {read_err}"
-                if old_string not in original_content: return f"Error: `old_string` not found in {file_path}."
-                new_content = original_content.replace(old_string, new_string, 1)
-                with open(path, 'w', encoding='utf-8') as f: f.write(new_content)
+                # One scan finds the first occurrence; the edited text is written around it, never joined in memory
+                index = original_content.find(old_string)
+                if index < 0: return f"Error: `old_string` not found in {file_path}."
+                _write_text_atomic(path, original_content[:index], new_string, original_content[index + len(old_string):])
                 return f"Successfully replaced first occurrence in {file_path}." if new_string else f"Successfully deleted first occurrence in {file_path}."
             elif old_string is None and new_string is None and content is None:
                  log.info(f"Creating empty file: {path}")
@@ -152,39 +403,63 @@ class GrepTool(BaseTool):
     def execute(self, pattern: str, path: str = '.', include: str | None = None) -> str:
         # No CWD logging needed here for now, focusing on ls/glob/summarize
         try:
-            if ".." in path.split(os.path.sep): return f"Error: Invalid path '{path}'."
-            target_path = os.path.abspath(os.path.expanduser(path)); log.info(f"Grepping in {target_path} for '{pattern}' (Include: {include})")
+            target_path = os.path.abspath(os.path.expanduser(path))
+            if not is_within_workspace(target_path): return f"Error: Invalid path '{path}'."
+            log.info(f"Grepping in {target_path} for '{pattern}' (Include: {include})")
             if not os.path.isdir(target_path): return f"Error: Path is not a directory: {path}"
-            try: regex = re.compile(pattern)
+            try: regex = _grep_regex(pattern)
             except re.error as re_err: return f"Error: Invalid regex pattern: {pattern} ({re_err})"
-            results = []; files_to_search = []
+            files_to_search = []
             if include:
                 recursive = '**' in include; glob_pattern = os.path.join(target_path, include)
-                try: files_to_search = glob.glob(glob_pattern, recursive=recursive)
+                try: files_to_search = _cached_glob(glob_pattern, target_path, recursive=recursive)
                 except Exception as glob_err: return f"Error finding files with include pattern: {glob_err}"
             else:
-                for root, _, filenames in os.walk(target_path):
-                    basename = os.path.basename(root)
-                    if basename.startswith('.') or basename == '__pycache__': continue
-                    files_to_search.extend(os.path.join(root, filename) for filename in filenames)
+                files_to_search = list(_iter_files(target_path))
             log.info(f"Found {len(files_to_search)} potential files to search.")
             files_searched_count = 0; matches_found_count = 0; max_matches = 500
-            for file_path in files_to_search:
-                if not os.path.isfile(file_path): continue
-                files_searched_count += 1
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        for i, line in enumerate(f, 1):
-                            if regex.search(line):
-                                matches_found_count += 1; rel_path = os.path.relpath(file_path, target_path)
-                                if os.path.dirname(rel_path) == '': rel_path = f"./{rel_path}"
-                                results.append(f"{rel_path}:{i}: {line.rstrip()}")
-                                if matches_found_count >= max_matches: results.append("--- Match limit reached ---"); break
-                except OSError: continue
-                except Exception as e: log.warning(f"Error grepping file {file_path}: {e}"); continue
-                if matches_found_count >= max_matches: break
+            limit_reached = threading.Event() # Set once enough matches are in; files not started yet are skipped
+
+            def scan(file_path):
+                """Matches in one file (up to max_matches), or None if it wasn't searched."""
+                if limit_reached.is_set(): return None
+                # Walked paths are known files; only glob matches still need the check
+                if include and not os.path.isfile(file_path): return None
+                try: return _grep_file(file_path, regex, max_matches)
+                except OSError: return None
+                except Exception as e: log.warning(f"Error grepping file {file_path}: {e}"); return None
+
+            # Files are scanned concurrently, but results are consumed in file order, so the output
+            # (and which matches survive the limit) is the same as a sequential scan. At most GREP_WINDOW
+            # files are queued at a time, so stopping at the limit leaves the rest never submitted
+            root_prefix = target_path.rstrip(os.sep) + os.sep
+            output = bytearray() # Raw match lines are appended as-is and decoded once at the end
+            with ThreadPoolExecutor(max_workers=GREP_MAX_WORKERS) as executor:
+                paths = iter(files_to_search)
+                window = deque((file_path, executor.submit(scan, file_path))
+                                           for file_path in itertools.islice(paths, GREP_WINDOW))
+                while window:
+                    file_path, future = window.popleft()
+                    for next_path in itertools.islice(paths, 1):
+                        window.append((next_path, executor.submit(scan, next_path)))
+                    file_matches = future.result()
+                    if file_matches is None: continue
+                    files_searched_count += 1
+                    if not file_matches: continue
+                    file_matches = file_matches[:max_matches - matches_found_count]
+                    rel_path = _relative_path(file_path, target_path, root_prefix)
+                    if os.sep not in rel_path: rel_path = f"./{rel_path}"
+                    rel_bytes = rel_path.encode('utf-8', 'surrogateescape')
+                    for i, line in file_matches:
+                        output += b'%s:%d: %s\n' % (rel_bytes, i, line)
+                    matches_found_count += len(file_matches)
+                    if matches_found_count >= max_matches:
+                        output += b"--- Match limit reached ---\n"
+                        limit_reached.set()
+                        for _, pending in window: pending.cancel()
+                        break
             log.info(f"Searched {files_searched_count} files, found {matches_found_count} matches.")
-            return "\n".join(results) if results else f"No matches found for pattern: {pattern}"
+            return output[:-1].decode('utf-8', 'ignore') if output else f"No matches found for pattern: {pattern}"
         except Exception as e: log.error(f"Error during grep: {e}", exc_info=True); return f"Error searching files: {str(e)}"
 
 class GlobTool(BaseTool):
@@ -194,14 +469,16 @@ class GlobTool(BaseTool):
     def execute(self, pattern: str, path: str = '.') -> str:
         log.debug(f"[GlobTool] Current working directory: {os.getcwd()}")
         try:
-            if ".." in path.split(os.path.sep): return f"Error: Invalid path '{path}'."
-            target_path = os.path.abspath(os.path.expanduser(path)); log.info(f"Globbing in {target_path} for '{pattern}'")
+            target_path = os.path.abspath(os.path.expanduser(path))
+            if not is_within_workspace(target_path): return f"Error: Invalid path '{path}'."
+            log.info(f"Globbing in {target_path} for '{pattern}'")
             if not os.path.isdir(target_path): return f"Error: Path is not a directory: {path}"
             search_pattern = os.path.join(target_path, pattern)
-            matches = glob.glob(search_pattern, recursive=True)
+            matches = _cached_glob(search_pattern, target_path, recursive=True)
             if matches:
-                relative_matches = sorted([os.path.relpath(m, target_path) for m in matches])
-                formatted_matches = [f"./{m}" if os.path.dirname(m) == '' else m for m in relative_matches]
+                root_prefix = target_path.rstrip(os.sep) + os.sep
+                relative_matches = sorted([_relative_path(m, target_path, root_prefix) for m in matches])
+                formatted_matches = [m if os.sep in m else f"./{m}" for m in relative_matches]
                 return "\n".join(formatted_matches)
             else: return f"No files or directories found matching pattern: {pattern}"
         except Exception as e: log.error(f"Error finding files with glob: {e}", exc_info=True); return f"Error finding files: {str(e)}"
\ No newline at end of file
@@ -1,42 +1,119 @@
 """
 Tools for code quality (linting, formatting).
 Requires external tools like 'ruff', 'black', 'flake8' etc. to be installed
-in the environment where this CLI runs.
+in the environment where this CLI runs. Set GEMINI_QUALITY_PARALLEL=1 to lint/format
+large directories in concurrent batches.
 """
-import subprocess
+import asyncio
 import logging
 import shlex
 import os
-from .base import BaseTool
+from .base import BaseTool, is_within_workspace, run_command_async, run_sync
 
 log = logging.getLogger(__name__)
 
+# --- Parallel runs over a directory (opt-in) ---
+# GEMINI_QUALITY_PARALLEL=1 splits a directory run into batches of files, each its own subprocess, run concurrently
+QUALITY_PARALLEL_ENV = "GEMINI_QUALITY_PARALLEL"
+QUALITY_BATCH_SIZE = 50 # Files per invocation; amortizes the tool's startup
+QUALITY_MAX_WORKERS = min(os.cpu_count() or 1, 8)
+# Files each known tool handles, and the flags that make it apply its configured excludes to files named
+# on the command line (ruff and black skip that check for explicit paths, so without the flag a batch
+# would lint vendored or generated files). Tools without such a flag (pylint, eslint) always get a
+# single run on the path, as do commands not listed here
+_TOOL_BATCHING = {
+    "ruff": ((".py", ".pyi"), ["--force-exclude"]),
+    "black": ((".py", ".pyi"), ["--force-exclude"]),
+    "isort": ((".py", ".pyi"), ["--filter-files"]),
+    "flake8": ((".py",), []), # Matches 'exclude' against explicit paths too
+    "prettier": ((".js", ".jsx", ".ts", ".tsx", ".css", ".scss", ".json", ".md", ".html", ".yaml", ".yml"), []), # Same for .prettierignore
+}
+_SKIP_DIRS = {"__pycache__", "node_modules"}
+
+def _discover_files(target_path: str, extensions: tuple[str, ...]) -> list[str]:
+    """Files under target_path with one of the extensions, skipping hidden dirs, caches and virtualenvs."""
+    files = []
+    stack = [target_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        if any(e.name == "pyvenv.cfg" for e in entries) and directory != target_path:
+            continue # A virtualenv: its packages aren't the project's code
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not (entry.name.startswith('.') or entry.name in _SKIP_DIRS):
+                    stack.append(entry.path)
+            elif entry.name.endswith(extensions):
+                files.append(entry.path)
+    return files
+
+def _parallel_batches(command_parts: list[str], target_path: str) -> list[tuple[list[str], list[str]]] | None:
+    """(command, files) per batch for a parallel run, or None if this run should stay a single invocation."""
+    if os.environ.get(QUALITY_PARALLEL_ENV) != "1" or not os.path.isdir(target_path):
+        return None
+    batching = _TOOL_BATCHING.get(os.path.basename(command_parts[0])) if command_parts else None
+    if not batching:
+        return None
+    extensions, exclude_flags = batching
+    files = _discover_files(target_path, extensions)
+    if len(files) <= QUALITY_BATCH_SIZE:
+        return None # One batch: nothing to overlap
+    command_parts = command_parts + [flag for flag in exclude_flags if flag not in command_parts]
+    return [(command_parts + batch, batch) for batch in
+            (files[i:i + QUALITY_BATCH_SIZE] for i in range(0, len(files), QUALITY_BATCH_SIZE))]
+
+def _batch_header(index: int, count: int, files: list[str], target_path: str, returncode: int) -> str:
+    """Header naming which files a batch's output is about."""
+    first, last = (os.path.relpath(f, target_path) for f in (files[0], files[-1]))
+    return f"=== Batch {index}/{count}: {len(files)} files, {first} .. {last} (Exit Code: {returncode}) ==="
+
 # --- Helper for running commands ---
-def _run_quality_command(command: list[str], tool_name: str) -> str:
-    log.info(f"Executing {tool_name} command: {' '.join(command)}")
+MAX_RESULT_CHARS = 2000 # Longer results are cut to their start
+# Only the start of each stream can reach the result; 4 bytes per char covers any UTF-8 text
+_OUTPUT_LIMIT = 4 * MAX_RESULT_CHARS
+
+async def _exec_command(command: list[str]) -> tuple[int, str, str]:
+    """(exit code, stdout, stderr) of one run. Raises FileNotFoundError / asyncio.TimeoutError."""
+    returncode, stdout, stderr = await run_command_async(command, timeout=120, # 2 minute timeout
+                                                         output_limit=_OUTPUT_LIMIT, keep_tail=False)
+    return returncode, stdout.strip(), stderr.strip()
+
+async def _run_quality_command(command: list[str], tool_name: str, target_path: str | None = None) -> str:
+    """Runs `command` (command_parts + [target_path]) and formats the result.
+    With GEMINI_QUALITY_PARALLEL=1 and a directory target, runs batches of files concurrently instead."""
+    # File discovery walks the tree; keep it off the event loop
+    batches = await asyncio.to_thread(_parallel_batches, command[:-1], target_path) if target_path else None
+    log.info(f"Executing {tool_name} command: {' '.join(command)}" + (f" in {len(batches)} parallel batches" if batches else ""))
     try:
-        process = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            check=False, # Check return code manually
-            timeout=120 # 2 minute timeout
-        )
-        stdout = process.stdout.strip()
-        stderr = process.stderr.strip()
-        log.info(f"{tool_name} completed. Exit Code: {process.returncode}")
+        if batches:
+            semaphore = asyncio.Semaphore(QUALITY_MAX_WORKERS)
+            async def run_limited(batch):
+                async with semaphore:
+                    return await _exec_command(batch)
+            runs = await asyncio.gather(*(run_limited(batch) for batch, _ in batches))
+            returncode = max(code for code, _, _ in runs)
+            headers = [_batch_header(i, len(batches), files, target_path, code)
+                       for i, ((_, files), (code, _, _)) in enumerate(zip(batches, runs), 1)]
+            stdout = "\n".join(f"{header}\n{out}" for header, (_, out, _) in zip(headers, runs) if out)
+            stderr = "\n".join(f"{header}\n{err}" for header, (_, _, err) in zip(headers, runs) if err)
+        else:
+            returncode, stdout, stderr = await _exec_command(command)
+        log.info(f"{tool_name} completed. Exit Code: {returncode}")
         log.debug(f"{tool_name} stdout:\n{stdout}")
         if stderr: log.debug(f"{tool_name} stderr:\n{stderr}")
 
-        result = f"{tool_name} Result (Exit Code: {process.returncode}):\n"
+        result = f"{tool_name} Result (Exit Code: {returncode}):\n"
         if stdout: result += f"-- Output --\n{stdout}\n"
         if stderr: result += f"-- Errors --\n{stderr}\n"
         if not stdout and not stderr: result += "(No output)"
 
-        # Truncate long results?
-        max_len = 2000
-        if len(result) > max_len:
-             result = result[:max_len] + "\n... (output truncated)"
+        # Truncate long results
+        if len(result) > MAX_RESULT_CHARS:
+             result = result[:MAX_RESULT_CHARS] + "\n... (output truncated)"
 
         return result
 
@@ -44,7 +121,7 @@ def _run_quality_command(command: list[str], tool_name: str) -> str:
         cmd_str = command[0]
         log.error(f"{tool_name} command '{cmd_str}' not found.")
         return f"Error: Command '{cmd_str}' not found. Is '{cmd_str}' installed and in PATH?"
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         log.error(f"{tool_name} run timed out.")
         return f"Error: {tool_name} run timed out (2 minutes)."
     except Exception as e:
@@ -68,16 +145,20 @@ class LinterCheckerTool(BaseTool):
         Returns:
             The output from the linter.
         """
-        if ".." in path.split(os.path.sep):
-             log.warning(f"Attempted to access parent directory in linter path: {path}")
-             return f"Error: Invalid path '{path}'. Cannot access parent directories."
+        return run_sync(self.execute_async(path, linter_command))
+
+    async def execute_async(self, path: str = '.', linter_command: str = 'ruff check') -> str:
+        """Runs the linter as an asyncio subprocess (or several); see execute()."""
         target_path = os.path.abspath(os.path.expanduser(path))
+        if not is_within_workspace(target_path):
+             log.warning(f"Attempted to access a path outside the workspace in linter path: {path}")
+             return f"Error: Invalid path '{path}'. Path is outside the current workspace."
 
         # Basic command splitting, assumes simple command name possibly with one arg
         command_parts = shlex.split(linter_command)
         command = command_parts + [target_path]
 
-        return _run_quality_command(command, "Linter")
+        return await _run_quality_command(command, "Linter", target_path)
 
 
 class FormatterTool(BaseTool):
@@ -96,13 +177,17 @@ class FormatterTool(BaseTool):
         Returns:
             The output from the formatter.
         """
-        if ".." in path.split(os.path.sep):
-             log.warning(f"Attempted to access parent directory in formatter path: {path}")
-             return f"Error: Invalid path '{path}'. Cannot access parent directories."
+        return run_sync(self.execute_async(path, formatter_command))
+
+    async def execute_async(self, path: str = '.', formatter_command: str = 'black') -> str:
+        """Runs the formatter as an asyncio subprocess (or several); see execute()."""
         target_path = os.path.abspath(os.path.expanduser(path))
+        if not is_within_workspace(target_path):
+             log.warning(f"Attempted to access a path outside the workspace in formatter path: {path}")
+             return f"Error: Invalid path '{path}'. Path is outside the current workspace."
 
         # Basic command splitting
         command_parts = shlex.split(formatter_command)
         command = command_parts + [target_path]
 
-        return _run_quality_command(command, "Formatter")
\ No newline at end of file
+        return await _run_quality_command(command, "Formatter", target_path)
\ No newline at end of file
@@ -4,13 +4,22 @@ Tool for summarizing code files using an LLM.
 import google.generativeai as genai
 import logging
 import os
-from .base import BaseTool
+import stat
+import threading
+from collections import OrderedDict
+from .base import BaseTool, is_within_workspace, run_sync
 
 log = logging.getLogger(__name__)
 
 # Define thresholds for summarization vs. full view
 MAX_LINES_FOR_FULL_CONTENT = 1000 # View files smaller than this directly
 MAX_CHARS_FOR_FULL_CONTENT = 50 * 1024 # 50 KB
+MAX_CHARS_TO_SUMMARIZE = 20000 # Only this much of a large file is sent for summarization
+
+# Finished summaries by (path, st_mtime_ns, st_size): any change to the file gives a new key
+SUMMARY_CACHE_MAX_ENTRIES = 256
+_SUMMARY_CACHE: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+_SUMMARY_CACHE_LOCK = threading.Lock() # execute() may run in several worker threads
 
 # Simple summarization prompt
 SUMMARIZATION_SYSTEM_PROMPT = """You are an expert code summarizer. Given the following code file content, provide a concise summary focusing on:
@@ -40,12 +49,18 @@ class SummarizeCodeTool(BaseTool):
         Initializes the SummarizeCodeTool.
         """
         super().__init__()
+        # Per model name: a model carrying SUMMARIZATION_SYSTEM_PROMPT as its system instruction
+        self._summary_models: dict[str, genai.GenerativeModel] = {}
 
     def execute(self, file_path: str, model_instance: genai.GenerativeModel) -> str:
         """
         Summarizes a code file. For small files, it returns the full content.
         # ... (rest of docstring)
         """
+        return run_sync(self.execute_async(file_path, model_instance))
+
+    async def execute_async(self, file_path: str, model_instance: genai.GenerativeModel) -> str:
+        """Awaits the summarization call (generate_content_async), so other tool calls keep running; see execute()."""
         log.debug(f"[SummarizeCodeTool] Current working directory: {os.getcwd()}")
         log.info(f"SummarizeCodeTool called with file='{file_path}'")
 
@@ -55,71 +70,74 @@ class SummarizeCodeTool(BaseTool):
              return "Error: Summarization tool not properly configured (model instance was not provided to execute method)."
 
         try:
+            target_path = os.path.abspath(os.path.expanduser(file_path))
             # Basic path safety
-            if ".." in file_path.split(os.path.sep):
-                 log.warning(f"Attempted access to parent directory: {file_path}")
+            if not is_within_workspace(target_path):
+                 log.warning(f"Attempted access outside the workspace: {file_path}")
                  return f"Error: Invalid file path '{file_path}'."
-
-            target_path = os.path.abspath(os.path.expanduser(file_path))
             log.info(f"Summarize/View file: {target_path}")
 
-            if not os.path.exists(target_path):
+            # One stat() answers existence, file type and size
+            try:
+                st = os.stat(target_path)
+            except FileNotFoundError:
                  return f"Error: File not found: {file_path}"
-            if not os.path.isfile(target_path):
+            if not stat.S_ISREG(st.st_mode):
                  return f"Error: Path is not a file: {file_path}"
 
-            # Check file size/lines
-            file_size = os.path.getsize(target_path)
-            line_count = 0
-            try:
-                 with open(target_path, 'r', encoding='utf-8', errors='ignore') as f:
-                      for _ in f:
-                           line_count += 1
-            except Exception:
-                 pass # Ignore line count errors, rely on size
+            cache_key = (target_path, st.st_mtime_ns, st.st_size)
+            with _SUMMARY_CACHE_LOCK:
+                cached = _SUMMARY_CACHE.get(cache_key)
+                if cached is not None:
+                    _SUMMARY_CACHE.move_to_end(cache_key)
+            if cached is not None:
+                log.info(f"Returning cached summary for '{file_path}'.")
+                return f"--- Summary of {file_path} ---\n{cached}"
+
+            # Check file size/lines. Anything at or over the size limit is summarized without counting lines.
+            file_size = st.st_size
+            data = None
+            line_count = None
+            if file_size < MAX_CHARS_FOR_FULL_CONTENT:
+                try:
+                    # A single read serves both the line count and the returned content
+                    with open(target_path, 'rb') as f:
+                        data = f.read()
+                except Exception as read_err:
+                    log.error(f"Error reading small file '{target_path}': {read_err}", exc_info=True)
+                    return f"Error reading file: {read_err}"
+                # Same count as iterating the lines: a final line without a newline counts too
+                line_count = data.count(b'\n') + (not data.endswith(b'\n') if data else 0)
 
             log.debug(f"File '{file_path}': Size={file_size} bytes, Lines={line_count}")
 
             # Return full content if file is small
-            if line_count < MAX_LINES_FOR_FULL_CONTENT and file_size < MAX_CHARS_FOR_FULL_CONTENT:
+            if line_count is not None and line_count < MAX_LINES_FOR_FULL_CONTENT:
                 log.info(f"File '{file_path}' is small, returning full content.")
-                try:
-                    with open(target_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                    # Add a prefix to indicate it's full content
-                    return f"--- Full Content of {file_path} ---\n{content}"
-                except Exception as read_err:
-                    log.error(f"Error reading small file '{target_path}': {read_err}", exc_info=True)
-                    return f"Error reading file: {read_err}"
+                # Add a prefix to indicate it's full content
+                return f"--- Full Content of {file_path} ---\n{data.decode('utf-8', 'ignore')}"
 
             # Generate summary if file is large
             else:
                 log.info(f"File '{file_path}' is large, attempting summarization...")
                 try:
-                    with open(target_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        # Limit content sent for summarization to avoid exceeding limits there too?
-                        # E.g., read only first/last N lines or first X KB. For now, read all.
-                        content_to_summarize = f.read()
+                    if data is None:
+                        # Read only the prefix that is sent, not the whole file
+                        with open(target_path, 'r', encoding='utf-8', errors='ignore') as f:
+                            content_to_summarize = f.read(MAX_CHARS_TO_SUMMARIZE)
+                    else:
+                        content_to_summarize = data.decode('utf-8', 'ignore')[:MAX_CHARS_TO_SUMMARIZE]
 
                     if not content_to_summarize.strip():
                          return f"--- Summary of {file_path} ---\n(File is empty)"
 
-                    # Prepare prompt for internal summarization call
-                    summarization_prompt = f"Please summarize the following code from the file '{file_path}':\n\n```\n{content_to_summarize[:20000]}\n```" # Limit sent content
-
-                    # Make the internal LLM call for summarization
-                    # Use a simpler generation config? No tools needed here.
-                    summary_config = genai.types.GenerationConfig(temperature=0.3) # Low temp for factual summary
-                    summary_response = model_instance.generate_content(
-                        contents=[
-                             # Provide system prompt separately if API supports it, otherwise prepend
-                             {'role': 'user', 'parts': [SUMMARIZATION_SYSTEM_PROMPT, summarization_prompt]}
-                        ],
-                        generation_config=summary_config,
-                        # safety_settings= ... # Use parent's safety settings?
-                    )
+                    summary_text, complete = await self._summarize_one(model_instance, file_path, content_to_summarize)
 
-                    summary_text = self._extract_text_from_summary_response(summary_response)
+                    if complete:
+                        with _SUMMARY_CACHE_LOCK: # Only complete summaries; a failed one is retried next time
+                            _SUMMARY_CACHE[cache_key] = summary_text
+                            while len(_SUMMARY_CACHE) > SUMMARY_CACHE_MAX_ENTRIES:
+                                _SUMMARY_CACHE.popitem(last=False)
 
                     # Add a prefix to indicate it's a summary
                     return f"--- Summary of {file_path} ---\n{summary_text}"
@@ -132,6 +150,50 @@ class SummarizeCodeTool(BaseTool):
             log.error(f"Error in SummarizeCodeTool for '{file_path}': {e}", exc_info=True)
             return f"Error processing file for summary/view: {str(e)}"
 
+    async def _summarize_one(self, model_instance, file_path: str, content: str) -> tuple[str, bool]:
+        """(summary, complete) from a call for this file alone."""
+        # Prepare prompt for internal summarization call
+        summarization_prompt = f"Please summarize the following code from the file '{file_path}':\n\n```\n{content}\n```"
+
+        # Make the internal LLM call for summarization
+        # Use a simpler generation config? No tools needed here.
+        summary_config = genai.types.GenerationConfig(temperature=0.3) # Low temp for factual summary
+        summary_response = await self._generate(model_instance, [summarization_prompt], summary_config)
+        return self._extract_text_from_summary_response(summary_response), self._is_complete(summary_response)
+
+    async def _generate(self, model_instance, parts: list[str], summary_config):
+        """One summarization request. SUMMARIZATION_SYSTEM_PROMPT goes in as the system instruction of a
+        model made for it, or is prepended to the parts if no such model can be made."""
+        summary_model = self._summary_model(model_instance)
+        if summary_model is None:
+            summary_model, parts = model_instance, [SUMMARIZATION_SYSTEM_PROMPT, *parts]
+        return await summary_model.generate_content_async(
+            contents=[{'role': 'user', 'parts': parts}],
+            generation_config=summary_config,
+            # safety_settings= ... # Use parent's safety settings?
+        )
+
+    def _summary_model(self, model_instance) -> genai.GenerativeModel | None:
+        """A model on model_instance's model, with SUMMARIZATION_SYSTEM_PROMPT as its system instruction,
+        so the prompt isn't resent in every request (and skips the agent's own prompt and tools). Built once per model name."""
+        model_name = getattr(model_instance, 'model_name', None)
+        if not isinstance(model_name, str):
+            return None
+        summary_model = self._summary_models.get(model_name)
+        if summary_model is None:
+            try:
+                summary_model = genai.GenerativeModel(model_name=model_name, system_instruction=SUMMARIZATION_SYSTEM_PROMPT)
+            except Exception as model_err: # e.g. an SDK without system_instruction
+                log.warning(f"Could not create summarization model for '{model_name}', prepending the prompt instead: {model_err}")
+                return None
+            self._summary_models[model_name] = summary_model
+        return summary_model
+
+    @staticmethod
+    def _is_complete(response) -> bool:
+        """True if the model finished normally, i.e. the text is a whole summary worth caching."""
+        return bool(response.candidates) and response.candidates[0].finish_reason.name == "STOP"
+
     # Helper to extract text from the internal summarization call's response
     def _extract_text_from_summary_response(self, response):
         try:
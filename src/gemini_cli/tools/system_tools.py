@@ -3,21 +3,47 @@ System operation tools.
 """
 
 import os
-import subprocess
+import shlex
+import asyncio
 import tempfile
-from .base import BaseTool
+from .base import BaseTool, run_command_async, run_sync
+
+_COMMAND_SEPARATOR_CHARS = frozenset(';|&()') # A token made only of these starts a new command
+
+def _command_words(command: str) -> set[str]:
+    """Words of a shell command line, unquoted and split at ; | & ( ). Words in command position (the
+    first word, or the first after a separator or a leading VAR=value) also appear with any directory
+    dropped, so '"curl"', 'curl;ls' and '/usr/bin/curl' all yield 'curl' but 'cat docs/ssh' doesn't yield 'ssh'."""
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    try:
+        words = list(lexer)
+    except ValueError: # Unbalanced quotes; the shell will reject it anyway
+        words = command.split()
+    result = set(words)
+    command_position = True
+    for word in words:
+        if set(word) <= _COMMAND_SEPARATOR_CHARS:
+            command_position = True
+        elif command_position:
+            result.add(os.path.basename(word))
+            # Assignments before a command ('LANG=C curl ...') leave the next word in command position
+            command_position = '=' in word and not word.startswith('=')
+    return result
 
 class BashTool(BaseTool):
     """Tool to execute bash commands."""
     
     name = "bash"
     description = "Execute a bash command"
+    thread_safe = False # Subprocesses share the process cwd and environment
     
     # List of banned commands for security
     BANNED_COMMANDS = [
         'curl', 'wget', 'nc', 'netcat', 'telnet',
         'lynx', 'w3m', 'links', 'ssh',
     ]
+    _BANNED_SET = frozenset(BANNED_COMMANDS)
     
     def execute(self, command, timeout=30000):
         """
@@ -27,11 +53,15 @@ class BashTool(BaseTool):
             command: The command to execute
             timeout: Timeout in milliseconds (optional)
         """
+        return run_sync(self.execute_async(command, timeout))
+
+    async def execute_async(self, command, timeout=30000):
+        """Runs the command as an asyncio subprocess; see execute()."""
         try:
             # Check for banned commands
-            for banned in self.BANNED_COMMANDS:
-                if banned in command.split():
-                    return f"Error: The command '{banned}' is not allowed for security reasons."
+            banned = self._BANNED_SET.intersection(_command_words(command))
+            if banned:
+                return f"Error: The command '{min(banned)}' is not allowed for security reasons."
             
             # Convert timeout to seconds (with better error handling)
             try:
@@ -41,24 +71,15 @@ class BashTool(BaseTool):
                 timeout_sec = 30
             
             # Remove the temporary directory context
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-            )
-            
             try:
-                stdout, stderr = process.communicate(timeout=timeout_sec)
+                returncode, stdout, stderr = await run_command_async(command, timeout=timeout_sec, shell=True)
                 
-                if process.returncode != 0:
-                    return f"Command exited with status {process.returncode}\n\nSTDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
+                if returncode != 0:
+                    return f"Command exited with status {returncode}\n\nSTDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
                 
                 return stdout
             
-            except subprocess.TimeoutExpired:
-                process.kill()
+            except asyncio.TimeoutError: # The process was killed
                 return f"Error: Command timed out after {timeout_sec} seconds"
         
         except Exception as e:
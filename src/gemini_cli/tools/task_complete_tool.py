@@ -6,6 +6,9 @@ from .base import BaseTool
 
 log = logging.getLogger(__name__)
 
+# Leading/trailing characters the LLM tends to wrap its summary in
+_STRIP = ' "\'\n\t'
+
 class TaskCompleteTool(BaseTool):
     """
     Signals that the current task/request is fully completed.
@@ -29,21 +32,16 @@ class TaskCompleteTool(BaseTool):
         # --- ADDED/MODIFIED: More Robust Cleaning --- 
         cleaned_summary = summary
         if isinstance(summary, str):
-            log.debug(f"Original summary from LLM (Type: {type(summary)}, Length: {len(summary)}): \"{summary}\"")
-            # Repeatedly strip common leading/trailing chars like quotes, spaces
-            strippable_chars = ' "\'\n\t'
-            while cleaned_summary.startswith(tuple(strippable_chars)) or cleaned_summary.endswith(tuple(strippable_chars)):
-                prev_summary = cleaned_summary
-                cleaned_summary = cleaned_summary.strip(strippable_chars)
-                if cleaned_summary == prev_summary: # Avoid infinite loop if strip doesn't change anything
-                    break 
-            log.debug(f"Final cleaned summary: \"{cleaned_summary}\"")
+            log.debug("Original summary from LLM (Length: %d): \"%s\"", len(summary), summary)
+            # One strip() removes every leading/trailing char in the set, however they are mixed
+            cleaned_summary = summary.strip(_STRIP)
+            log.debug("Final cleaned summary: \"%s\"", cleaned_summary)
         else:
              log.warning(f"TaskCompleteTool received non-string summary type: {type(summary)}")
              cleaned_summary = str(summary).strip() # Attempt to convert and strip
         # --- END ADDED/MODIFIED SECTION ---
         
-        log.debug(f"Processing summary (cleaned): {cleaned_summary}")
+        log.debug("Processing summary (cleaned): %s", cleaned_summary)
         if not cleaned_summary or len(cleaned_summary) < 5:
              log.warning("TaskCompleteTool called with missing or very short summary.")
              # Provide a default confirmation if summary is bad/missing
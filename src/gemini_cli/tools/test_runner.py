@@ -2,14 +2,17 @@
 Tool for running automated tests (e.g., pytest).
 """
 
-import subprocess
+import asyncio
 import logging
 import shlex
-from .base import BaseTool
+from .base import BaseTool, run_command_async, run_sync
 
 # Configure logging for this tool
 log = logging.getLogger(__name__)
 
+# Only the end of a test run's output is kept (a failure's details and the summary come last)
+TEST_OUTPUT_LIMIT = 100 * 1024 # Bytes per stream
+
 class TestRunnerTool(BaseTool):
     """
     Tool to execute automated tests using a test runner like pytest.
@@ -31,6 +34,10 @@ class TestRunnerTool(BaseTool):
         Returns:
             A string summarizing the test results, including output on failure.
         """
+        return run_sync(self.execute_async(test_path, options, runner_command))
+
+    async def execute_async(self, test_path: str | None = None, options: str | None = None, runner_command: str = "pytest") -> str:
+        """Runs the tests as an asyncio subprocess, so a long run doesn't block other tool calls."""
         command = [runner_command]
 
         if options:
@@ -48,18 +55,10 @@ class TestRunnerTool(BaseTool):
         log.info(f"Executing test command: {' '.join(command)}")
 
         try:
-            # Execute the command, capture output, set a timeout (e.g., 5 minutes)
-            process = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                check=False, # Don't raise exception on non-zero exit code, we'll check it manually
-                timeout=300 # Timeout in seconds (e.g., 5 minutes)
-            )
-
-            exit_code = process.returncode
-            stdout = process.stdout.strip()
-            stderr = process.stderr.strip()
+            # Execute the command, keep the tail of its output, set a timeout (e.g., 5 minutes)
+            exit_code, stdout, stderr = await run_command_async(command, timeout=300, output_limit=TEST_OUTPUT_LIMIT)
+            stdout = stdout.strip()
+            stderr = stderr.strip()
 
             log.info(f"Test run completed. Exit Code: {exit_code}")
             log.debug(f"Test stdout:\n{stdout}")
@@ -91,7 +90,7 @@ class TestRunnerTool(BaseTool):
         except FileNotFoundError:
             log.error(f"Test runner command '{runner_command}' not found.")
             return f"Error: Test runner command '{runner_command}' not found. Is it installed and in PATH?"
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             log.error("Test run timed out.")
             return "Error: Test run exceeded the timeout limit (5 minutes)."
         except Exception as e:
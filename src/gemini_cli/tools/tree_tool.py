@@ -1,7 +1,7 @@
 """
-Tool for displaying directory structure using the 'tree' command.
+Tool for displaying directory structure, like the 'tree' command.
 """
-import subprocess
+import os
 import logging
 from google.generativeai.types import FunctionDeclaration, Tool
 
@@ -11,6 +11,51 @@ log = logging.getLogger(__name__)
 
 DEFAULT_TREE_DEPTH = 3
 MAX_TREE_DEPTH = 10
+TREE_MAX_LINES = 200
+
+def _tree_children(path: str) -> list[os.DirEntry]:
+    """Visible entries of a directory, directories first, then by name. Hidden entries are skipped, as tree does."""
+    with os.scandir(path) as it:
+        entries = [e for e in it if not e.name.startswith('.')]
+    # DirEntry.is_dir() is answered from the directory read, so sorting costs no stat calls
+    entries.sort(key=lambda e: (not e.is_dir(follow_symlinks=False), e.name))
+    return entries
+
+def _count(count: int, singular: str, plural: str) -> str:
+    return f"{count} {singular if count == 1 else plural}"
+
+def _walk_tree(root: str, depth_limit: int) -> tuple[str, bool]:
+    """`tree -L depth_limit --dirsfirst`-style text for root, and whether it was cut at TREE_MAX_LINES.
+    Raises OSError if root can't be listed."""
+    lines = [root]
+    n_dirs = n_files = 0
+    # Entries still to print, last on top: (entry, prefix of its parent's children, is last child, depth)
+    children = _tree_children(root)
+    stack = [(e, "", i == len(children) - 1, 1) for i, e in reversed(list(enumerate(children)))]
+    while stack:
+        if len(lines) >= TREE_MAX_LINES:
+            return "\n".join(lines), True
+        entry, prefix, is_last, depth = stack.pop()
+        line = f"{prefix}{'└── ' if is_last else '├── '}{entry.name}"
+        if entry.is_symlink():
+            try: line += f" -> {os.readlink(entry.path)}"
+            except OSError: pass
+        if entry.is_dir(follow_symlinks=False):
+            n_dirs += 1
+            if depth < depth_limit:
+                try:
+                    grandchildren = _tree_children(entry.path)
+                except OSError:
+                    line += "  [error opening dir]"
+                else:
+                    child_prefix = prefix + ("    " if is_last else "│   ")
+                    stack.extend((e, child_prefix, i == len(grandchildren) - 1, depth + 1)
+                                 for i, e in reversed(list(enumerate(grandchildren))))
+        else:
+            n_files += 1
+        lines.append(line)
+    lines.append(f"\n{_count(n_dirs, 'directory', 'directories')}, {_count(n_files, 'file', 'files')}")
+    return "\n".join(lines), False
 
 class TreeTool(BaseTool):
     name: str = "tree"
@@ -34,59 +79,32 @@ class TreeTool(BaseTool):
     required_args: list[str] = []
 
     def execute(self, path: str | None = None, depth: int | None = None) -> str:
-        """Executes the tree command."""
-        
+        """Shows the directory tree, walked with os.scandir instead of running tree."""
         if depth is None:
             depth_limit = DEFAULT_TREE_DEPTH
         else:
             # Clamp depth to be within reasonable limits
             depth_limit = max(1, min(depth, MAX_TREE_DEPTH))
-            
-        command = ['tree', '-L', str(depth_limit)]
-        
-        # Add path if specified
-        target_path = "." # Default to current directory
-        if path:
-            # Basic path validation/sanitization might be needed depending on security context
-            target_path = path
-            command.append(target_path)
 
-        log.info(f"Executing tree command: {' '.join(command)}")
-        try:
-            # Adding '-a' might be useful to show hidden files, but could be verbose.
-            # Adding '-F' appends / to dirs, * to executables, etc.
-            # Using shell=True is generally discouraged, but might be needed if tree isn't directly in PATH
-            # or if handling complex paths. Sticking to list format for now.
-            process = subprocess.run(
-                command, 
-                capture_output=True, 
-                text=True, 
-                check=False, # Don't raise exception on non-zero exit code
-                timeout=15 # Add a timeout
-            )
-
-            if process.returncode == 0:
-                log.info(f"Tree command successful for path '{target_path}' with depth {depth_limit}.")
-                # Limit output size? Tree can be huge.
-                output = process.stdout.strip()
-                if len(output.splitlines()) > 200: # Limit lines as a proxy for size
-                     log.warning(f"Tree output for '{target_path}' exceeded 200 lines. Truncating.")
-                     output = "\n".join(output.splitlines()[:200]) + "\n... (output truncated)"
-                return output
-            elif process.returncode == 127 or "command not found" in process.stderr.lower():
-                 log.error(f"\'tree\' command not found. It might not be installed.")
-                 return "Error: 'tree' command not found. Please ensure it is installed and in the system's PATH."
-            else:
-                log.error(f"Tree command failed with return code {process.returncode}. Path: '{target_path}', Depth: {depth_limit}. Stderr: {process.stderr.strip()}")
-                error_detail = process.stderr.strip() if process.stderr else "(No stderr)"
-                return f"Error executing tree command (Code: {process.returncode}): {error_detail}"
+        # Basic path validation/sanitization might be needed depending on security context
+        target_path = path or "." # Default to current directory
 
-        except FileNotFoundError:
-             log.error(f"\'tree\' command not found (FileNotFoundError). It might not be installed.")
-             return "Error: 'tree' command not found. Please ensure it is installed and in the system's PATH."
-        except subprocess.TimeoutExpired:
-             log.error(f"Tree command timed out for path '{target_path}' after 15 seconds.")
-             return f"Error: Tree command timed out for path '{target_path}'. The directory might be too large or complex."
+        log.info(f"Building tree for path '{target_path}' with depth {depth_limit}")
+        try:
+            if not os.path.isdir(target_path):
+                if os.path.exists(target_path):
+                    return f"Error: Not a directory: '{target_path}'"
+                log.error(f"Tree failed: Directory not found '{target_path}'.")
+                return f"Error: Directory not found: '{target_path}'"
+            output, truncated = _walk_tree(target_path, depth_limit)
+            log.info(f"Tree successful for path '{target_path}' with depth {depth_limit}.")
+            if truncated: # Tree can be huge
+                log.warning(f"Tree output for '{target_path}' exceeded {TREE_MAX_LINES} lines. Truncating.")
+                output += "\n... (output truncated)"
+            return output
+        except OSError as e:
+            log.error(f"Tree failed for path '{target_path}': {e}")
+            return f"Error listing directory '{target_path}': {e.strerror or e}"
         except Exception as e:
-            log.exception(f"An unexpected error occurred while executing tree command for path '{target_path}': {e}")
-            return f"An unexpected error occurred while executing tree: {str(e)}" 
\ No newline at end of file
+            log.exception(f"An unexpected error occurred while building the tree for path '{target_path}': {e}")
+            return f"An unexpected error occurred while executing tree: {str(e)}"
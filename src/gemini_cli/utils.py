@@ -2,19 +2,57 @@
 Utility functions for the Gemini CLI tool.
 """
 
-import tiktoken
+import os
 import json
+import logging
 
-def count_tokens(text):
+log = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    # The GPT-4 tokenizer, loaded once (encoding_for_model() re-reads the vocabulary on every call)
+    # and warmed with an empty encode so the first real count doesn't pay for setup
+    _ENCODING = tiktoken.encoding_for_model("gpt-4")
+    _ENCODING.encode("")
+except Exception as e: # tiktoken missing, or its vocabulary can't be fetched (e.g. first run offline)
+    log.warning(f"tiktoken unavailable, estimating token counts at ~4 chars per token: {e}")
+    _ENCODING = None
+
+# Shorter ASCII strings are estimated at ~4 chars per token instead of being encoded: off by a few tokens at most
+SHORT_TEXT_CHARS = 64
+
+def _is_short_ascii(text) -> bool:
+    return len(text) < SHORT_TEXT_CHARS and text.isascii()
+
+def count_tokens(text, exact: bool = False):
     """
     Count the number of tokens in a text string.
-    
+
     This is a rough estimate for Gemini 2.5 Pro, using GPT-4 tokenizer as a proxy.
     For production, you'd want to use model-specific token counting.
+    Short ASCII strings skip the tokenizer unless exact=True.
     """
-    try:
-        encoding = tiktoken.encoding_for_model("gpt-4")
-        return len(encoding.encode(text))
-    except Exception:
+    if not exact and _is_short_ascii(text):
+        return (len(text) + 3) // 4
+    if _ENCODING is None:
         # Fallback method: roughly 4 chars per token
-        return len(text) // 4
\ No newline at end of file
+        return len(text) // 4
+    # Special-token text such as '<|endoftext|>' in file contents is counted as ordinary text
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+def count_tokens_batch(texts: list[str], exact: bool = False) -> list[int]:
+    """
+    Count tokens for several strings at once; returns one count per text, in order.
+
+    tiktoken encodes the batch on a thread pool and releases the GIL while it does.
+    Short ASCII strings are estimated as in count_tokens() and never reach the encoder.
+    """
+    counts = [None if exact or not _is_short_ascii(text) else (len(text) + 3) // 4 for text in texts]
+    to_encode = [text for text, count in zip(texts, counts) if count is None]
+    if not to_encode:
+        return counts
+    if _ENCODING is None:
+        encoded = iter(len(text) // 4 for text in to_encode)
+    else:
+        encoded = iter(len(tokens) for tokens in _ENCODING.encode_batch(to_encode, num_threads=os.cpu_count() or 1, disallowed_special=()))
+    return [next(encoded) if count is None else count for count in counts]
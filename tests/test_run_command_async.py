@@ -0,0 +1,53 @@
+"""
+Tests for run_command_async's timeout handling.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+from gemini_cli.tools.base import run_command_async
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "killpg"), reason="needs POSIX process groups")
+
+
+@pytest.mark.parametrize("output_limit", [None, 1024])
+def test_timeout_kills_shell_grandchild(output_limit):
+    # 'sleep' is a grandchild of the shell and holds its stdout/stderr open
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_command_async("sleep 30; echo hi", timeout=1, shell=True, output_limit=output_limit))
+    assert time.monotonic() - start < 5
+
+
+def test_timeout_kills_background_grandchild(tmp_path):
+    pid_file = tmp_path / "pid"
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run_command_async(f"sleep 30 & echo $! > {pid_file}; wait", timeout=1, shell=True))
+    assert time.monotonic() - start < 5
+    time.sleep(0.2)
+    assert not _is_running(int(pid_file.read_text()))
+
+
+def _is_running(pid):
+    """False once pid is gone or a zombie (killed but not yet reaped by init)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+    except OSError: # No procfs: fall back to signal 0 (a zombie counts as running here)
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+
+def test_completes_within_timeout():
+    returncode, stdout, stderr = asyncio.run(run_command_async([sys.executable, "-c", "print('ok')"], timeout=10))
+    assert (returncode, stdout, stderr) == (0, "ok\n", "")